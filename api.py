@@ -1,79 +1,414 @@
 import json
+import threading
+import time
+from concurrent.futures import Future
 
 import requests
-from requests_toolbelt.multipart.encoder import MultipartEncoder
+from requests_toolbelt.multipart.encoder import MultipartEncoder, MultipartEncoderMonitor
+from urllib3.util.retry import Retry
+
+from bulk import run_bulk
+from instrumentation import InstrumentedAdapter, RequestEvent, start_timings, stop_timings
+from pet_index import PetIndex
+from photo_processing import PhotoProcessor
+from photos import open_photo
+from records import Pet, decode
+from response_cache import ResponseCache
+from streaming import iter_json_array
 
 
 class PetFriends:
-    def __init__(self):
-        self.base_url = 'https://petfriends.skillfactory.ru'
+    def __init__(self, base_url: str = 'https://petfriends.skillfactory.ru', pool_connections: int = 10,
+                 pool_maxsize: int = 10, pool_block: bool = False, timeout: float = 30, retries: int = 3,
+                 backoff_factor: float = 0.3, retry_statuses: tuple = (429, 500, 502, 503, 504),
+                 key_ttl: float = 3600, mmap_photos: bool = False, list_cache: ResponseCache = None,
+                 typed: bool = False, photo_processor: PhotoProcessor = None):
+        '''All methods share one keep-alive session, so repeated calls to the same server reuse already opened
+        TCP/TLS connections instead of doing a new handshake every time. The session can be used from many threads.
+
+        pool_connections - how many hosts keep their own connection pool,
+        pool_maxsize - how many connections are kept open per host,
+        pool_block - wait for a free connection instead of opening a temporary one when the pool is exhausted,
+        timeout - seconds to wait for connecting and for the server response (a number or a (connect, read) tuple),
+        retries, backoff_factor, retry_statuses - how many times and with what exponential delay a request is repeated
+        after a dropped connection or one of the retry statuses. POST requests are repeated only if they could not
+        reach the server, so a pet is never added twice.
+        key_ttl - seconds an auth key received by get_api_key is cached for its email and password (0 disables the cache),
+        mmap_photos - memory-map photo files given by path instead of reading them through a file buffer,
+        list_cache - a response_cache.ResponseCache for the results of get_list_of_pets. Adding, changing or deleting
+        a pet through this client drops the cached lists the change affects,
+        typed - return pets, alone or in the 'pets' of a list, as compact records.Pet instead of dicts. Responses are
+        decoded with orjson if it is installed,
+        photo_processor - a photo_processing.PhotoProcessor that downsizes and recompresses photos before they are
+        uploaded; add_new_pets processes the photos of all pets in parallel first.
+
+        Every method that takes 'auth_key' also accepts an (email, password) tuple instead of the key, in which case
+        the key is taken from the cache. If a request made with a cached key returns 403, the key is requested again
+        and the request is repeated once with the new key.
+
+        Functions added with add_hook receive an instrumentation.RequestEvent after every request, e.g.
+        instrumentation.Metrics for counters and latency histograms. Without hooks no timings are collected.'''
+
+        self.base_url = base_url
+        self.timeout = timeout
+
+        retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=retry_statuses,
+                      raise_on_status=False, respect_retry_after_header=True)
+        adapter = InstrumentedAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                              max_retries=retry, pool_block=pool_block)
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.key_ttl = key_ttl
+        self.mmap_photos = mmap_photos
+        self.index = None
+        self.list_cache = list_cache
+        self.typed = typed
+        self.photo_processor = photo_processor
+        self.hooks = []
+        self._keys = {}
+        self._key_owners = {}
+        self._key_flights = {}
+        self._keys_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        '''The method closes all pooled connections. The client must not be used after that.'''
+
+        self.session.close()
+
+    def add_hook(self, hook):
+        '''The method registers hook(event) to be called with an instrumentation.RequestEvent after every request'''
+
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def _request(self, name: str, method: str, path: str, **kwargs) -> requests.Response:
+        '''Sends the request through the shared session with the configured timeout. 'name' is the client method
+        the request is made for. With hooks registered, the timings of the request are attached to the response
+        and reported once it is decoded by _result'''
+
+        kwargs.setdefault('timeout', self.timeout)
+        if not self.hooks:
+            return self.session.request(method, self.base_url + path, **kwargs)
+
+        timings = start_timings()
+        started = time.perf_counter()
+        try:
+            responce = self.session.request(method, self.base_url + path, **kwargs)
+        except Exception as error:
+            self._emit(RequestEvent(name, method, path, None, None, None, timings['dns'], timings['connect'],
+                                    None, time.perf_counter() - started, None, error))
+            raise
+        finally:
+            stop_timings()
+
+        if kwargs.get('stream'):
+            response_bytes = int(responce.headers.get('Content-Length') or 0)
+        else:
+            response_bytes = len(responce.content)
+        responce.event = RequestEvent(name, method, path, responce.status_code,
+                                      int(responce.request.headers.get('Content-Length') or 0), response_bytes,
+                                      timings['dns'], timings['connect'], responce.elapsed.total_seconds(),
+                                      time.perf_counter() - started, None, None)
+        return responce
+
+    def _emit(self, event: RequestEvent):
+        for hook in list(self.hooks):
+            hook(event)
+
+    def _result(self, responce: requests.Response) -> tuple:
+        '''Returns the status and the result decoded from JSON, or the response text if it is not JSON. Every response
+        of the client is decoded here, once'''
+
+        event = getattr(responce, 'event', None)
+        started = time.perf_counter()
+
+        status = responce.status_code
+        result = decode(responce.content, self.typed)
 
+        if event is not None:
+            self._emit(event._replace(decode=time.perf_counter() - started))
+        return status, result
 
-    def get_api_key(self, email: str, password: str) -> json:
-        '''The method sends a request to the server's API and returns the request status and the result in JSON format
-        with a unique user key found using the specified email and password'''
+    def _authenticate(self, credentials: tuple, since: float, rejected: str = None) -> tuple:
+        '''Requests a new key for the credentials unless another thread has already received one after 'since'
+        that is not the 'rejected' key. Only one request per credentials is in flight at a time: other threads wait
+        for it and get its outcome, whether it is a key, a failure or an exception. With 'key_ttl' 0 or less every
+        call sends its own request. Returns the status and the result like get_api_key; the result is the cached dict
+        itself'''
+
+        if self.key_ttl <= 0:
+            return self._request_key(credentials)
+
+        with self._keys_lock:
+            entry = self._keys.get(credentials)
+            if (entry is not None and entry[1] > since and entry[0]['key'] != rejected
+                    and entry[1] + self.key_ttl > time.monotonic()):
+                return 200, entry[0]
+
+            flight = self._key_flights.get(credentials)
+            leader = flight is None
+            if leader:
+                flight = self._key_flights[credentials] = Future()
+
+        if not leader:
+            return flight.result()
+
+        try:
+            outcome = self._request_key(credentials)
+        except BaseException as error:
+            flight.set_exception(error)
+            raise
+        else:
+            flight.set_result(outcome)
+            return outcome
+        finally:
+            with self._keys_lock:
+                del self._key_flights[credentials]
+
+    def _request_key(self, credentials: tuple) -> tuple:
+        '''Sends one key request and stores a received key in the cache'''
 
         headers = {
-            'email': email,
-            'password': password
+            'email': credentials[0],
+            'password': credentials[1]
         }
 
-        responce = requests.get(self.base_url + '/api/key', headers = headers)
+        status, result = self._result(self._request('get_api_key', 'GET', '/api/key', headers = headers))
 
-        status = responce.status_code
-        result = ""
+        if status != 200 or not isinstance(result, dict) or 'key' not in result:
+            return status, result
 
-        try:
-            result = responce.json()
-        except json.decoder.JSONDecodeError:
-            result = responce.text
+        with self._keys_lock:
+            self._keys[credentials] = (result, time.monotonic())
+            self._key_owners[result['key']] = credentials
+        return status, result
+
+    def _send_authorized(self, auth_key, send, decode: bool = True):
+        '''Calls send(key) with the key string taken from the 'auth_key' dict or resolved from (email, password).
+        If the server answers 403 to a key of known credentials, send is called once more with the cached key of the
+        credentials if it is already another one, or else with a key requested again if that one has changed.
+        send must build the request body itself, because a streamed body can be sent only once.
+        Returns the status and the result, or the response itself if 'decode' is False; in that case a failure to get
+        the key from (email, password) raises requests.HTTPError'''
+
+        if isinstance(auth_key, dict):
+            key = auth_key['key']
+            credentials = self._key_owners.get(key)
+        else:
+            credentials = tuple(auth_key)
+            status, result = self._authenticate(credentials, float('-inf'))
+            if status != 200 or not isinstance(result, dict) or 'key' not in result:
+                if not decode:
+                    raise requests.HTTPError('Could not get the key: %s %s' % (status, result))
+                return status, result
+            key = result['key']
+
+        responce = send(key)
+
+        if responce.status_code == 403 and credentials is not None:
+            status, fresh = self._authenticate(credentials, float('-inf'), rejected=key)
+            if status == 200 and isinstance(fresh, dict) and fresh.get('key') != key:
+                if getattr(responce, 'event', None) is not None:
+                    self._emit(responce.event)
+                responce.close()
+                responce = send(fresh['key'])
+
+        return self._result(responce) if decode else responce
+
+    def _send_photo(self, name: str, key: str, path: str, fields: dict, pet_photo, progress=None) -> requests.Response:
+        '''Sends a multipart body with the photo that is streamed from its source in small chunks while the request is
+        written, so the whole image is never loaded into memory. The file is closed as soon as the request is done.
+        progress(bytes_sent, total_bytes) is called after every chunk if it is set'''
+
+        with open_photo(pet_photo, self.mmap_photos) as (filename, photo, content_type):
+            data = MultipartEncoder(fields=dict(fields, pet_photo=(filename, photo, content_type)))
+            if progress is not None:
+                data = MultipartEncoderMonitor(data, lambda monitor: progress(monitor.bytes_read, monitor.len))
+            headers = {'auth_key': key, 'Content-Type': data.content_type}
+
+            return self._request(name, 'POST', path, headers=headers, data=data)
+
+    def _pet_changed(self, auth_key, status: int, result, pet_id: str = None, deleted: bool = False):
+        '''Applies the result of a request that added, changed or deleted a pet to the attached index and drops the
+        cached lists it affects. A successful answer without pet data and a server error leave the index stale,
+        because their effect is unknown'''
+
+        if self.list_cache is not None and (status == 200 or status >= 500):
+            self.list_cache.invalidate(auth_key['key'] if isinstance(auth_key, dict) else self._cached_key(auth_key))
+
+        index = self.index
+        if index is None:
+            return
+
+        if status == 200 and deleted:
+            index.remove(pet_id)
+        elif status == 200 and isinstance(result, (dict, Pet)) and (pet_id or result.get('id')):
+            pet = dict(result, id=result.get('id', pet_id))
+            index.put(Pet.from_dict(pet) if self.typed else pet)
+        elif status == 200 or status >= 500:
+            index.mark_stale()
+
+    def _cached_key(self, credentials) -> str:
+        '''Returns the cached key string of (email, password) or None'''
+
+        entry = self._keys.get(tuple(credentials))
+        return entry[0]['key'] if entry is not None else None
+
+    def forget_api_key(self, email: str, password: str):
+        '''The method removes the cached key of the user, so the next call requests it from the server again'''
+
+        with self._keys_lock:
+            entry = self._keys.pop((email, password), None)
+            if entry is not None:
+                self._key_owners.pop(entry[0]['key'], None)
+
+    def get_api_key(self, email: str, password: str, refresh: bool = False) -> json:
+        '''The method sends a request to the server's API and returns the request status and the result in JSON format
+        with a unique user key found using the specified email and password. A key received less than 'key_ttl' seconds
+        ago is returned from the cache without a request unless 'refresh' is True'''
+
+        since = time.monotonic() if refresh else float('-inf')
+        status, result = self._authenticate((email, password), since)
+
+        if isinstance(result, dict):
+            result = dict(result)
         return status, result
 
     def get_list_of_pets(self, auth_key: json, filter: str) -> json:
         '''The method sends a request to the server's API and returns the request status and the result in JSON format,
         including a list of found pets that match the filter. The filter can have an empty value to get a list of all pets
-        or 'my_pets' to get a list of a user's own pets.'''
+        or 'my_pets' to get a list of a user's own pets. With 'list_cache' set, a recently received list is returned
+        from the cache, and an older one is only downloaded again if the server says it has changed; a cached result
+        is shared between calls and must not be modified.'''
 
-        headers = {'auth_key': auth_key['key']}
+        if self.list_cache is not None:
+            return self._get_cached_list_of_pets(auth_key, filter)
 
         filter = {'filter': filter}
 
-        responce = requests.get(self.base_url + '/api/pets', headers=headers, params=filter)
-
-        status = responce.status_code
-        result = ""
-
-        try:
-            result = responce.json()
-        except json.decoder.JSONDecodeError:
-            result = responce.text
+        status, result = self._send_authorized(auth_key, lambda key: self._request(
+            'get_list_of_pets', 'GET', '/api/pets', headers={'auth_key': key}, params=filter))
 
-        print(result)
         return status, result
 
-    def add_new_pet(self, auth_key: json, name: str, animal_type: str, age: str, pet_photo: str) -> json:
-        '''The method sends a POST request to the server's API to add a new pet and returns the request status and the result
-        in JSON format with information about the added pet.'''
+    def _get_cached_list_of_pets(self, auth_key, filter: str) -> tuple:
+        cache = self.list_cache
+
+        if not isinstance(auth_key, dict):
+            status, auth_key = self._authenticate(tuple(auth_key), float('-inf'))
+            if status != 200 or not isinstance(auth_key, dict) or 'key' not in auth_key:
+                return status, auth_key
+
+        entry = cache.get((auth_key['key'], filter))
+        if entry is not None and cache.is_fresh(entry):
+            return 200, entry.result
+        generation = cache.generation
+
+        def send(key):
+            headers = {'auth_key': key}
+            if entry is not None and key == auth_key['key']:
+                if entry.etag:
+                    headers['If-None-Match'] = entry.etag
+                if entry.last_modified:
+                    headers['If-Modified-Since'] = entry.last_modified
+            return self._request('get_list_of_pets', 'GET', '/api/pets', headers=headers, params={'filter': filter})
+
+        responce = self._send_authorized(auth_key, send, decode=False)
+        # The key may have been renewed after a 403
+        key = responce.request.headers['auth_key']
+
+        if responce.status_code == 304 and entry is not None:
+            self._result(responce)
+            cache.touch((key, filter))
+            return 200, entry.result
+
+        status, result = self._result(responce)
+        if status == 200 and isinstance(result, dict):
+            cache.put((key, filter), result, responce.headers.get('ETag'), responce.headers.get('Last-Modified'),
+                      generation)
+        return status, result
 
-        data = MultipartEncoder(
-            fields={
-                'name': name,
-                'animal_type': animal_type,
-                'age': age,
-                'pet_photo': (pet_photo, open(pet_photo, 'rb'), 'image/jpeg')
-            })
-        headers = {'auth_key': auth_key['key'], 'Content-Type': data.content_type}
+    def iter_pets(self, auth_key: json, filter: str, fields: tuple = None, limit: int = None,
+                  chunk_size: int = 65536):
+        '''The method requests the same list as get_list_of_pets but reads the response as a stream and yields the pets
+        one by one as they arrive, so memory use does not grow with the length of the list. 'fields' leaves only the
+        listed keys of every pet (e.g. ('id', 'name')), 'limit' stops after that many pets and closes the connection
+        without reading the rest. Raises requests.HTTPError if the server does not answer 200.'''
 
-        responce = requests.post(self.base_url + '/api/pets', headers=headers, data=data)
+        filter = {'filter': filter}
 
-        status = responce.status_code
-        result = ""
+        responce = self._send_authorized(auth_key, lambda key: self._request(
+            'iter_pets', 'GET', '/api/pets', headers={'auth_key': key}, params=filter, stream=True), decode=False)
 
+        started = time.perf_counter()
         try:
-            result = responce.json()
-        except json.decoder.JSONDecodeError:
-            result = responce.text
+            with responce:
+                responce.raise_for_status()
+                if limit is not None and limit <= 0:
+                    return
+
+                for count, pet in enumerate(iter_json_array(responce.iter_content(chunk_size), 'pets'), 1):
+                    if fields is not None:
+                        pet = {field: pet[field] for field in fields if field in pet}
+                    elif self.typed:
+                        pet = Pet.from_dict(pet)
+                    yield pet
+                    if count == limit:
+                        return
+        finally:
+            # The body is read while the caller iterates, so the request is reported when the iteration ends
+            event = getattr(responce, 'event', None)
+            if event is not None:
+                self._emit(event._replace(total=event.total + time.perf_counter() - started))
+
+    def build_index(self, auth_key: json) -> PetIndex:
+        '''The method loads the user's own pets with one streamed list request into a PetIndex, attaches it to the client
+        as 'index' and returns it. After that every add, update, photo and delete request made through this client
+        updates the index, so a pet can be found by ID, name or animal type without requesting the list again.
+        The index tracks the pets of one user, so it must only be used with the same 'auth_key'.'''
+
+        index = self.index if self.index is not None else PetIndex()
+        index.load(self.iter_pets(auth_key, 'my_pets'))
+        self.index = index
+        return index
+
+    def resync_index(self, auth_key: json, force: bool = False) -> PetIndex:
+        '''The method requests the list of the user's own pets again only if there is no index yet, the index is stale
+        or 'force' is set, and returns the index'''
+
+        if self.index is None or self.index.stale or force:
+            return self.build_index(auth_key)
+        return self.index
+
+    def add_new_pet(self, auth_key: json, name: str, animal_type: str, age: str, pet_photo: str,
+                    progress=None) -> json:
+        '''The method sends a POST request to the server's API to add a new pet and returns the request status and the result
+        in JSON format with information about the added pet. 'pet_photo' can be a path, bytes or a seekable binary file object,
+        its content type is detected from the data. progress(bytes_sent, total_bytes) is called while the photo is uploaded.'''
+
+        fields = {
+            'name': name,
+            'animal_type': animal_type,
+            'age': age
+        }
+        if self.photo_processor is not None:
+            pet_photo = self.photo_processor.process(pet_photo)
+
+        status, result = self._send_authorized(auth_key, lambda key: self._send_photo(
+            'add_new_pet', key, '/api/pets', fields, pet_photo, progress))
 
+        self._pet_changed(auth_key, status, result)
         return status, result
 
     def delete_pet(self, auth_key: json, pet_id: str) -> json:
@@ -81,19 +416,10 @@ class PetFriends:
         in JSON format with a success notification message. Currently, there is a bug where the 'result' field receives an empty string,
         but the 'status' is still 200"""
 
-        headers = {'auth_key': auth_key['key']}
-
-        responce = requests.delete(self.base_url + '/api/pets/' + pet_id, headers=headers)
-
-        status = responce.status_code
-        result = ""
-
-        try:
-            result = responce.json()
-        except json.decoder.JSONDecodeError:
-            result = responce.text
+        status, result = self._send_authorized(auth_key, lambda key: self._request(
+            'delete_pet', 'DELETE', '/api/pets/' + pet_id, headers={'auth_key': key}))
 
-        print(status, result)
+        self._pet_changed(auth_key, status, result, pet_id, deleted=True)
         return status, result
 
     def update_pet_info(self, auth_key: json, pet_id: str, name: str,
@@ -101,65 +427,101 @@ class PetFriends:
         """The method sends a PUT request to the server to update pet data based on the specified ID and returns the request status
         and 'result' in JSON format with the updated pet data."""
 
-        headers = {'auth_key': auth_key['key']}
         data = {
             'name': name,
             'age': age,
             'animal_type': animal_type
         }
 
-        responce = requests.put(self.base_url + '/api/pets/' + pet_id, headers=headers, data=data)
-
-        status = responce.status_code
-        result = ""
-
-        try:
-            result = responce.json()
-        except json.decoder.JSONDecodeError:
-            result = responce.text
+        status, result = self._send_authorized(auth_key, lambda key: self._request(
+            'update_pet_info', 'PUT', '/api/pets/' + pet_id, headers={'auth_key': key}, data=data))
 
-        print(result)
+        self._pet_changed(auth_key, status, result, pet_id)
         return status, result
 
-    def add_photo_of_pet(self, auth_key: json, pet_id: str, pet_photo: str) -> json:
+    def add_photo_of_pet(self, auth_key: json, pet_id: str, pet_photo: str, progress=None) -> json:
         """The method sends a POST request to the server to add a photo to an already created pet based on its ID
-        and returns the request status and 'result' in JSON format with the updated data"""
-
-        headers = {'auth_key': auth_key['key']}
-        file = {'pet_photo': (pet_photo, open(pet_photo, 'rb'), 'image/jpeg')}
+        and returns the request status and 'result' in JSON format with the updated data. 'pet_photo' and 'progress'
+        are the same as in add_new_pet"""
 
-        responce = requests.post(self.base_url + '/api/pets/set_photo/' + pet_id, headers=headers, files=file)
+        if self.photo_processor is not None:
+            pet_photo = self.photo_processor.process(pet_photo)
 
-        status = responce.status_code
-        result = ""
+        status, result = self._send_authorized(auth_key, lambda key: self._send_photo(
+            'add_photo_of_pet', key, '/api/pets/set_photo/' + pet_id, {}, pet_photo, progress))
 
-        try:
-            result = responce.json()
-        except json.decoder.JSONDecodeError:
-            result = responce.text
-        print(status)
+        self._pet_changed(auth_key, status, result, pet_id)
         return status, result
 
     def add_new_pet_without_photo(self, auth_key: json, name: str, animal_type: str, age: str) -> json:
         '''The method sends a POST request to the server's API to add a new pet without a photo and returns the request status
         and the result in JSON format with pet data.'''
 
-        data = MultipartEncoder(
-            fields={
-                'name': name,
-                'animal_type': animal_type,
-                'age': age,
-            })
-        headers = {'auth_key': auth_key['key'], 'Content-Type': data.content_type}
-
-        responce = requests.post(self.base_url + '/api/create_pet_simple', headers=headers, data=data)
+        def send(key):
+            data = MultipartEncoder(
+                fields={
+                    'name': name,
+                    'animal_type': animal_type,
+                    'age': age,
+                })
+            headers = {'auth_key': key, 'Content-Type': data.content_type}
 
-        status = responce.status_code
-        result = ""
+            return self._request('add_new_pet_without_photo', 'POST', '/api/create_pet_simple',
+                                 headers=headers, data=data)
 
-        try:
-            result = responce.json()
-        except json.decoder.JSONDecodeError:
-            result = responce.text
+        status, result = self._send_authorized(auth_key, send)
 
+        self._pet_changed(auth_key, status, result)
         return status, result
+
+    def add_new_pets(self, auth_key: json, pets: list, max_workers: int = 8, rate_limit: float = None) -> list:
+        '''The method adds many pets in parallel and returns a list of bulk.BulkResult in the order of 'pets'.
+        Every pet is a dict with 'name', 'animal_type', 'age' and an optional 'pet_photo'; pets without a photo
+        are added by add_new_pet_without_photo. No more than 'max_workers' requests run at the same time
+        (keep it below 'pool_maxsize' to reuse connections) and no more than 'rate_limit' start per second.'''
+
+        processed = {}
+        if self.photo_processor is not None:
+            with_photo = [pet for pet in pets if pet.get('pet_photo')]
+            photos = self.photo_processor.process_many([pet['pet_photo'] for pet in with_photo])
+            processed = {id(pet): photo for pet, photo in zip(with_photo, photos)}
+
+        def add(pet):
+            if pet.get('pet_photo'):
+                photo = processed.get(id(pet), pet['pet_photo'])
+                if isinstance(photo, Exception):
+                    # Reported in the BulkResult of this pet like any other failure
+                    raise photo
+                status, result = self.add_new_pet(auth_key, pet['name'], pet['animal_type'], pet['age'], photo)
+            else:
+                status, result = self.add_new_pet_without_photo(auth_key, pet['name'], pet['animal_type'],
+                                                                pet['age'])
+            return status, result, result.get('id') if isinstance(result, (dict, Pet)) else None
+
+        return run_bulk(add, pets, max_workers, rate_limit)
+
+    def update_pets(self, auth_key: json, updates: list, max_workers: int = 8, rate_limit: float = None) -> list:
+        '''The method updates many pets in parallel and returns a list of bulk.BulkResult in the order of 'updates'.
+        Every update is a dict with 'pet_id', 'name', 'animal_type' and 'age'.'''
+
+        def update(pet):
+            status, result = self.update_pet_info(auth_key, pet['pet_id'], pet['name'], pet['animal_type'], pet['age'])
+            return status, result, pet['pet_id']
+
+        return run_bulk(update, updates, max_workers, rate_limit)
+
+    def delete_pets(self, auth_key: json, pet_ids: list = None, max_workers: int = 8, rate_limit: float = None) -> list:
+        '''The method deletes the pets with the given IDs in parallel and returns a list of bulk.BulkResult.
+        If 'pet_ids' is not set, the list of the user's own pets is requested once and all of them are deleted.'''
+
+        if pet_ids is None:
+            status, my_pets = self.get_list_of_pets(auth_key, 'my_pets')
+            if status != 200:
+                raise ValueError('Could not get the list of my pets: %s %s' % (status, my_pets))
+            pet_ids = [pet['id'] for pet in my_pets['pets']]
+
+        def delete(pet_id):
+            status, result = self.delete_pet(auth_key, pet_id)
+            return status, result, pet_id
+
+        return run_bulk(delete, pet_ids, max_workers, rate_limit)
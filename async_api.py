@@ -0,0 +1,134 @@
+import asyncio
+import os
+
+import aiohttp
+
+from photos import detect_content_type
+from records import decode
+
+
+class AsyncPetFriends:
+    def __init__(self, base_url: str = 'https://petfriends.skillfactory.ru', max_concurrency: int = 100,
+                 limit_per_host: int = 100, timeout: float = 30, typed: bool = False):
+        '''Asyncio version of api.PetFriends. All methods are coroutines with the same arguments that return the same
+        (status, result) pair. Requests share one aiohttp session with a keep-alive connection pool, and no more than
+        'max_concurrency' of them are in flight at the same time, so hundreds of calls can be gathered on one event loop.
+
+        limit_per_host - how many connections are opened to the server at most,
+        timeout - seconds for the whole request including reading the response,
+        typed - return pets as records.Pet like api.PetFriends does.'''
+
+        self.base_url = base_url
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.typed = typed
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        '''The method closes the session with all its connections. A new session is opened on the next request.'''
+
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _request(self, method: str, path: str, **kwargs) -> tuple:
+        '''Sends the request through the shared session and returns the status and the result decoded from JSON,
+        or the response text if it is not JSON'''
+
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.limit_per_host)
+            self._session = aiohttp.ClientSession(connector=connector,
+                                                  timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+        async with self._semaphore:
+            async with self._session.request(method, self.base_url + path, **kwargs) as responce:
+                status = responce.status
+                body = await responce.read()
+
+        return status, decode(body, self.typed)
+
+    @staticmethod
+    def _form(fields: dict, photo=None) -> aiohttp.MultipartWriter:
+        '''Builds a multipart/form-data body like the MultipartEncoder used by api.PetFriends'''
+
+        data = aiohttp.MultipartWriter('form-data')
+        for name, value in fields.items():
+            part = data.append(str(value))
+            part.set_content_disposition('form-data', name=name)
+        if photo is not None:
+            filename = os.path.basename(photo.name)
+            content_type = detect_content_type(photo.read(16), filename)
+            photo.seek(0)
+            part = data.append(photo, {'Content-Type': content_type})
+            part.set_content_disposition('form-data', name='pet_photo', filename=filename)
+        return data
+
+    async def get_api_key(self, email: str, password: str) -> tuple:
+        '''Returns the request status and the result with a unique user key found using the email and password'''
+
+        headers = {
+            'email': email,
+            'password': password
+        }
+
+        return await self._request('GET', '/api/key', headers=headers)
+
+    async def get_list_of_pets(self, auth_key: dict, filter: str) -> tuple:
+        '''Returns the request status and the list of pets that match the filter: an empty value for all pets
+        or 'my_pets' for the user's own pets'''
+
+        headers = {'auth_key': auth_key['key']}
+
+        return await self._request('GET', '/api/pets', headers=headers, params={'filter': filter})
+
+    async def add_new_pet(self, auth_key: dict, name: str, animal_type: str, age: str, pet_photo: str) -> tuple:
+        '''Adds a new pet with a photo and returns the request status and information about the added pet'''
+
+        headers = {'auth_key': auth_key['key']}
+
+        with open(pet_photo, 'rb') as photo:
+            data = self._form({'name': name, 'animal_type': animal_type, 'age': age}, photo)
+            return await self._request('POST', '/api/pets', headers=headers, data=data)
+
+    async def delete_pet(self, auth_key: dict, pet_id: str) -> tuple:
+        '''Removes a pet by ID and returns the request status and the result'''
+
+        headers = {'auth_key': auth_key['key']}
+
+        return await self._request('DELETE', '/api/pets/' + pet_id, headers=headers)
+
+    async def update_pet_info(self, auth_key: dict, pet_id: str, name: str, animal_type: str, age: int) -> tuple:
+        '''Updates pet data by ID and returns the request status and the updated pet data'''
+
+        headers = {'auth_key': auth_key['key']}
+        data = {
+            'name': name,
+            'age': str(age),
+            'animal_type': animal_type
+        }
+
+        return await self._request('PUT', '/api/pets/' + pet_id, headers=headers, data=data)
+
+    async def add_photo_of_pet(self, auth_key: dict, pet_id: str, pet_photo: str) -> tuple:
+        '''Adds a photo to an already created pet by ID and returns the request status and the updated data'''
+
+        headers = {'auth_key': auth_key['key']}
+
+        with open(pet_photo, 'rb') as photo:
+            data = self._form({}, photo)
+            return await self._request('POST', '/api/pets/set_photo/' + pet_id, headers=headers, data=data)
+
+    async def add_new_pet_without_photo(self, auth_key: dict, name: str, animal_type: str, age: str) -> tuple:
+        '''Adds a new pet without a photo and returns the request status and the pet data'''
+
+        headers = {'auth_key': auth_key['key']}
+        data = self._form({'name': name, 'animal_type': animal_type, 'age': age})
+
+        return await self._request('POST', '/api/create_pet_simple', headers=headers, data=data)
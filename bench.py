@@ -0,0 +1,212 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+
+from api import PetFriends
+from stand_in_server import StandInServer
+
+IMAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tests', 'images')
+PHOTOS = {
+    'small': os.path.join(IMAGES, 'zebra_small.jpg'),
+    'medium': os.path.join(IMAGES, 'zebra.jpg'),
+    'large': os.path.join(IMAGES, 'lion.jpg'),
+}
+
+
+def percentile(values: list, q: float) -> float:
+    '''Returns the q-th percentile (0-100) of sorted values with linear interpolation between the closest ranks'''
+
+    if not values:
+        return 0.0
+    rank = (len(values) - 1) * q / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
+def summarize(latencies: list, elapsed: float) -> dict:
+    '''Returns throughput and latency statistics in milliseconds for the durations of single calls in seconds'''
+
+    latencies = sorted(latencies)
+    return {
+        'count': len(latencies),
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'mean_ms': sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': latencies[-1] * 1000 if latencies else 0.0,
+    }
+
+
+class TrafficCounter:
+    def __init__(self):
+        '''Response hook for requests that adds up the bytes of requests and responses, headers included'''
+
+        self.sent = 0
+        self.received = 0
+
+    def __call__(self, responce, *args, **kwargs):
+        request = responce.request
+        self.sent += len(request.method) + len(request.url) + sum(len(k) + len(v) + 4 for k, v in request.headers.items())
+        self.sent += int(request.headers.get('Content-Length') or 0)
+        self.received += sum(len(k) + len(v) + 4 for k, v in responce.headers.items())
+        self.received += int(responce.headers.get('Content-Length') or 0)
+
+
+def bench_cases(pf: PetFriends, auth_key: dict, email: str, password: str, created: list) -> dict:
+    '''Returns {case name: (setup, call)}. setup(iterations) prepares what the calls need and returns a list of
+    arguments, one for every call; call(argument) makes one measured call of a PetFriends method. The IDs of the pets
+    the setups and calls add and do not delete themselves are appended to 'created'.'''
+
+    def own_pets(count):
+        pets = pf.add_new_pets(auth_key, [{'name': 'Bench', 'animal_type': 'cat', 'age': '1'}] * count)
+        return [report.pet_id for report in pets]
+
+    def one_pet(count):
+        pet_ids = own_pets(1)
+        created.extend(pet_ids)
+        return pet_ids * count
+
+    def added(response):
+        _, result = response
+        if isinstance(result, dict) and 'id' in result:
+            created.append(result['id'])
+
+    cases = {
+        'get_api_key': (None, lambda _: pf.get_api_key(email, password, refresh=True)),
+        'get_list_of_pets_all': (None, lambda _: pf.get_list_of_pets(auth_key, '')),
+        'get_list_of_pets_my_pets': (None, lambda _: pf.get_list_of_pets(auth_key, 'my_pets')),
+        'iter_pets_all': (None, lambda _: sum(1 for _ in pf.iter_pets(auth_key, '', fields=('id',)))),
+        'add_new_pet_without_photo': (
+            None, lambda _: added(pf.add_new_pet_without_photo(auth_key, 'Bench', 'cat', '1'))),
+        'update_pet_info': (one_pet, lambda pet_id: pf.update_pet_info(auth_key, pet_id, 'Bench', 'dog', 2)),
+        'delete_pet': (own_pets, lambda pet_id: pf.delete_pet(auth_key, pet_id)),
+    }
+    for size, photo in PHOTOS.items():
+        cases['add_new_pet_%s' % size] = (
+            None, lambda _, photo=photo: added(pf.add_new_pet(auth_key, 'Bench', 'zebra', '1', photo)))
+        cases['add_photo_of_pet_%s' % size] = (
+            one_pet, lambda pet_id, photo=photo: pf.add_photo_of_pet(auth_key, pet_id, photo))
+    return cases
+
+
+def run(pf: PetFriends, email: str, password: str, iterations: int = 50, warmup: int = 5, only: list = None) -> dict:
+    '''Runs every benchmark case 'warmup' times without measuring and then 'iterations' times, and returns
+    {case name: statistics with bytes sent and received per call}. The pets a case adds are deleted after it'''
+
+    _, auth_key = pf.get_api_key(email, password)
+    counter = TrafficCounter()
+    pf.session.hooks['response'].append(counter)
+    results = {}
+    created = []
+
+    for name, (setup, call) in bench_cases(pf, auth_key, email, password, created).items():
+        if only and name not in only:
+            continue
+
+        arguments = setup(warmup + iterations) if setup else [None] * (warmup + iterations)
+        for argument in arguments[:warmup]:
+            call(argument)
+
+        counter.sent = counter.received = 0
+        latencies = []
+        started = time.perf_counter()
+        for argument in arguments[warmup:]:
+            call_started = time.perf_counter()
+            call(argument)
+            latencies.append(time.perf_counter() - call_started)
+        elapsed = time.perf_counter() - started
+
+        results[name] = summarize(latencies, elapsed)
+        results[name]['bytes_sent'] = counter.sent / iterations
+        results[name]['bytes_received'] = counter.received / iterations
+
+        if created:
+            pf.delete_pets(auth_key, created)
+            del created[:]
+
+    pf.session.hooks['response'].remove(counter)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float = 0.2, metric: str = 'p50_ms') -> list:
+    '''Returns (case name, baseline value, current value) for every case whose metric is more than 'threshold'
+    (a share, 0.2 = 20%) worse than in the baseline. Cases missing in either run are not compared'''
+
+    regressions = []
+    for name, stats in results.items():
+        if name in baseline and stats[metric] > baseline[name][metric] * (1 + threshold):
+            regressions.append((name, baseline[name][metric], stats[metric]))
+    return regressions
+
+
+def print_report(results: dict):
+    print('%-28s %10s %9s %9s %9s %12s %12s' % ('case', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'sent B', 'received B'))
+    for name, stats in results.items():
+        print('%-28s %10.1f %9.2f %9.2f %9.2f %12.0f %12.0f' % (
+            name, stats['throughput'], stats['p50_ms'], stats['p95_ms'], stats['p99_ms'],
+            stats['bytes_sent'], stats['bytes_received']))
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark of every PetFriends method')
+    parser.add_argument('--iterations', type=int, default=50, help='measured calls per case')
+    parser.add_argument('--warmup', type=int, default=5, help='calls per case before measuring')
+    parser.add_argument('--pets', type=int, default=100, help='pets of another user on the stand-in server')
+    parser.add_argument('--latency', type=float, default=0.0, help='latency injected by the stand-in server')
+    parser.add_argument('--base-url', help='benchmark this server instead of a local stand-in')
+    parser.add_argument('--email', default='bench@petfriends.local')
+    parser.add_argument('--password', default='bench')
+    parser.add_argument('--only', nargs='*', help='names of the cases to run')
+    parser.add_argument('--output', default='bench_results.json', help='file to store the results in')
+    parser.add_argument('--baseline', help='results file to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown against the baseline, 0.2 = 20%%')
+    parser.add_argument('--metric', default='p50_ms', choices=['mean_ms', 'p50_ms', 'p95_ms', 'p99_ms'])
+    args = parser.parse_args(argv)
+
+    with contextlib.ExitStack() as stack:
+        base_url = args.base_url
+        if base_url is None:
+            server = stack.enter_context(StandInServer(users={args.email: args.password}, latency=args.latency))
+            with open(PHOTOS['small'], 'rb') as file:
+                photo = file.read()
+            server.add_user('other@petfriends.local', 'other')
+            for _ in range(args.pets):
+                server.add_pet('other@petfriends.local', 'Other', 'zebra', '3', photo)
+            base_url = server.base_url
+
+        pf = stack.enter_context(PetFriends(base_url))
+        results = run(pf, args.email, args.password, args.iterations, args.warmup, args.only)
+
+    print_report(results)
+
+    report = {
+        'meta': {
+            'base_url': args.base_url or 'stand-in',
+            'iterations': args.iterations,
+            'python': platform.python_version(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+        regressions = compare(results, baseline, args.threshold, args.metric)
+        for name, before, after in regressions:
+            print('REGRESSION %s: %s %.2f -> %.2f' % (name, args.metric, before, after))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,54 @@
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# One line of a bulk operation report. 'item' is the input the operation was called with, 'status' and 'result' are
+# what the single method returned (None if it raised), 'error' is the exception or the non-JSON result of a failed
+# request, 'latency' is the duration of the call in seconds.
+BulkResult = namedtuple('BulkResult', ['item', 'status', 'pet_id', 'result', 'error', 'latency'])
+
+
+class RateLimiter:
+    def __init__(self, rate: float):
+        '''Spaces calls evenly so that no more than 'rate' of them start per second, across all threads'''
+
+        self.interval = 1.0 / rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        '''Blocks until the calling thread is allowed to start its call'''
+
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def run_bulk(operation, items, max_workers: int = 8, rate_limit: float = None) -> list:
+    '''Calls operation(item) for every item on a pool of 'max_workers' threads, starting no more than 'rate_limit'
+    calls per second if it is set. operation must return (status, result, pet_id). Returns a BulkResult for every
+    item in the same order; a failed item never stops the others.'''
+
+    limiter = RateLimiter(rate_limit) if rate_limit else None
+
+    def run(item):
+        if limiter is not None:
+            limiter.wait()
+
+        started = time.perf_counter()
+        try:
+            status, result, pet_id = operation(item)
+        except Exception as error:
+            return BulkResult(item, None, None, None, error, time.perf_counter() - started)
+
+        latency = time.perf_counter() - started
+        error = None if status == 200 else result or 'HTTP %s' % status
+        return BulkResult(item, status, pet_id, result, error, latency)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(run, items))
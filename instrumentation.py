@@ -0,0 +1,162 @@
+import bisect
+import socket
+import threading
+import time
+from collections import namedtuple
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError
+
+# What a hook receives after every request of PetFriends. 'method_name' is the client method that made the request,
+# 'endpoint' the requested path. Sizes are in bytes of the bodies, times in seconds: 'dns' and 'connect' (TCP and TLS)
+# are 0 when a pooled connection was reused, 'ttfb' runs until the response headers have arrived, 'total' until the body
+# has been read, 'decode' is the time of decoding the JSON. 'status' is None and 'error' is set if the request failed.
+RequestEvent = namedtuple('RequestEvent', ['method_name', 'http_method', 'endpoint', 'status', 'request_bytes',
+                                           'response_bytes', 'dns', 'connect', 'ttfb', 'total', 'decode', 'error'])
+
+_local = threading.local()
+
+
+def start_timings() -> dict:
+    '''Starts collecting the connection timings of the requests made by the current thread and returns their dict'''
+
+    _local.timings = {'dns': 0.0, 'connect': 0.0}
+    return _local.timings
+
+
+def stop_timings():
+    _local.timings = None
+
+
+class _TimedConnectionMixin:
+    '''Measures name resolution and connection setup of new connections while timings are collected'''
+
+    def _new_conn(self):
+        timings = getattr(_local, 'timings', None)
+        if timings is None:
+            return super()._new_conn()
+
+        # Resolve the name here to time it, then let urllib3 connect to the resolved addresses one by one
+        host = self._dns_host
+        started = time.perf_counter()
+        try:
+            addresses = list(dict.fromkeys(info[4][0] for info in socket.getaddrinfo(host, self.port,
+                                                                                        type=socket.SOCK_STREAM)))
+        except socket.gaierror:
+            addresses = [host]
+        timings['dns'] += time.perf_counter() - started
+
+        try:
+            for number, address in enumerate(addresses, 1):
+                self._dns_host = address
+                try:
+                    return super()._new_conn()
+                except ConnectTimeoutError:
+                    # NewConnectionError is a ConnectTimeoutError too
+                    if number == len(addresses):
+                        raise
+        finally:
+            self._dns_host = host
+
+    def connect(self):
+        timings = getattr(_local, 'timings', None)
+        if timings is None:
+            return super().connect()
+
+        started = time.perf_counter()
+        dns = timings['dns']
+        try:
+            super().connect()
+        finally:
+            timings['connect'] += time.perf_counter() - started - (timings['dns'] - dns)
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class InstrumentedAdapter(HTTPAdapter):
+    '''HTTPAdapter whose connections report DNS and connect times. Without collected timings they behave like the
+    usual ones apart from one attribute lookup per new connection'''
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': TimedHTTPConnectionPool,
+                                                   'https': TimedHTTPSConnectionPool}
+
+
+class Metrics:
+    # Upper bounds of the latency histogram buckets in seconds
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+    def __init__(self):
+        '''Hook for PetFriends.add_hook that keeps counters and a latency histogram for every client method.
+        snapshot() returns a copy of them that can be read while requests go on'''
+
+        self._lock = threading.Lock()
+        self._methods = {}
+
+    def __call__(self, event: RequestEvent):
+        with self._lock:
+            stats = self._methods.get(event.method_name)
+            if stats is None:
+                stats = self._methods[event.method_name] = {
+                    'count': 0,
+                    'errors': 0,
+                    'statuses': {},
+                    'request_bytes': 0,
+                    'response_bytes': 0,
+                    'total_seconds': 0.0,
+                    'max_seconds': 0.0,
+                    'histogram': [0] * len(self.BUCKETS),
+                }
+
+            stats['count'] += 1
+            if event.status is None or event.status >= 400:
+                stats['errors'] += 1
+            stats['statuses'][event.status] = stats['statuses'].get(event.status, 0) + 1
+            stats['request_bytes'] += event.request_bytes or 0
+            stats['response_bytes'] += event.response_bytes or 0
+            stats['total_seconds'] += event.total
+            stats['max_seconds'] = max(stats['max_seconds'], event.total)
+            stats['histogram'][bisect.bisect_left(self.BUCKETS, event.total)] += 1
+
+    def reset(self):
+        with self._lock:
+            self._methods.clear()
+
+    def snapshot(self) -> dict:
+        '''Returns {method name: counters} with the histogram as {bucket upper bound: count} and p50/p95/p99
+        estimated as the upper bound of the bucket the percentile falls into'''
+
+        with self._lock:
+            methods = {name: dict(stats, statuses=dict(stats['statuses']), histogram=list(stats['histogram']))
+                       for name, stats in self._methods.items()}
+
+        for stats in methods.values():
+            counts = stats['histogram']
+            stats['histogram'] = dict(zip(self.BUCKETS, counts))
+            stats['mean_seconds'] = stats['total_seconds'] / stats['count']
+            for q in (50, 95, 99):
+                rank = stats['count'] * q / 100
+                seen = 0
+                for bound, count in zip(self.BUCKETS, counts):
+                    seen += count
+                    if seen >= rank:
+                        stats['p%d_seconds' % q] = min(bound, stats['max_seconds'])
+                        break
+        return methods
@@ -0,0 +1,353 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api import PetFriends
+from bench import summarize
+
+DEFAULT_PHOTO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tests', 'images', 'zebra_small.jpg')
+
+# Operations a virtual user can make and their default weights in the mix. update, set_photo and delete work on a pet
+# the user has added before; a user without pets makes add_simple instead
+DEFAULT_MIX = {
+    'list': 4,
+    'list_my': 2,
+    'add': 1,
+    'add_simple': 1,
+    'update': 1,
+    'set_photo': 1,
+    'delete': 2,
+}
+
+
+class Recorder:
+    def __init__(self):
+        '''Collects the latencies and errors of the operations of all virtual users of one process'''
+
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._errors = {}
+
+    def record(self, operation: str, latency: float, ok: bool):
+        with self._lock:
+            self._latencies.setdefault(operation, []).append(latency)
+            if not ok:
+                self._errors[operation] = self._errors.get(operation, 0) + 1
+
+    def drain(self) -> dict:
+        '''Returns {operation: (latencies, errors)} recorded since the previous call'''
+
+        with self._lock:
+            latencies, errors = self._latencies, self._errors
+            self._latencies, self._errors = {}, {}
+        return {operation: (values, errors.get(operation, 0)) for operation, values in latencies.items()}
+
+
+class VirtualUser:
+    def __init__(self, pf: PetFriends, credentials: tuple, mix: dict, photo: str, recorder: Recorder):
+        '''One simulated user: logs in with get_api_key and then makes operations chosen at random by their weights'''
+
+        self.pf = pf
+        self.credentials = credentials
+        self.operations = list(mix)
+        self.weights = list(mix.values())
+        self.photo = photo
+        self.recorder = recorder
+        self.random = random.Random()
+        self.auth_key = None
+        self.pet_ids = []
+        self.backoff = 0.0
+
+    def login(self) -> bool:
+        '''Requests a key; a failed attempt, including an exception such as an unreachable server, is recorded
+        as a failed login and followed by a pause that doubles with every failure in a row, up to a second'''
+
+        started = time.perf_counter()
+        try:
+            status, result = self.pf.get_api_key(*self.credentials)
+            ok = status == 200 and isinstance(result, dict)
+        except Exception:
+            ok = False
+        self.recorder.record('login', time.perf_counter() - started, ok)
+
+        if ok:
+            self.auth_key = result
+            self.backoff = 0.0
+        else:
+            self.backoff = min(max(self.backoff * 2, 0.05), 1.0)
+            time.sleep(self.backoff)
+        return ok
+
+    def step(self, scheduled: float = None):
+        '''Makes one operation. In an open loop 'scheduled' is the perf_counter time it was due, and the latency
+        is counted from then, so the time spent waiting for a free user is included'''
+
+        if self.auth_key is None and not self.login():
+            return
+
+        operation = self.random.choices(self.operations, self.weights)[0]
+        if operation in ('update', 'set_photo', 'delete') and not self.pet_ids:
+            operation = 'add_simple'
+
+        started = time.perf_counter() if scheduled is None else scheduled
+        try:
+            status, result = self._call(operation)
+            ok = status == 200
+        except Exception:
+            ok = False
+        self.recorder.record(operation, time.perf_counter() - started, ok)
+
+    def _call(self, operation: str) -> tuple:
+        pf, auth_key = self.pf, self.auth_key
+
+        if operation == 'list':
+            return pf.get_list_of_pets(auth_key, '')
+        if operation == 'list_my':
+            return pf.get_list_of_pets(auth_key, 'my_pets')
+        if operation in ('add', 'add_simple'):
+            if operation == 'add':
+                status, result = pf.add_new_pet(auth_key, 'Load', 'cat', '1', self.photo)
+            else:
+                status, result = pf.add_new_pet_without_photo(auth_key, 'Load', 'cat', '1')
+            if status == 200 and isinstance(result, dict) and 'id' in result:
+                self.pet_ids.append(result['id'])
+            return status, result
+
+        pet_id = self.random.choice(self.pet_ids)
+        if operation == 'update':
+            return pf.update_pet_info(auth_key, pet_id, 'Load', 'dog', 2)
+        if operation == 'set_photo':
+            return pf.add_photo_of_pet(auth_key, pet_id, self.photo)
+
+        self.pet_ids.remove(pet_id)
+        return pf.delete_pet(auth_key, pet_id)
+
+
+def _worker(base_url: str, credentials: list, users: int, rate: float, mode: str, mix: dict, think_time: float,
+            photo: str, start_at: float, duration: float, interval: float, results):
+    '''Runs 'users' virtual users of one process and puts what they recorded into 'results' every 'interval' seconds,
+    then None when it is done'''
+
+    recorder = Recorder()
+    # Without the key cache every login is a real /api/key request, sent without waiting for the logins of other users
+    pf = PetFriends(base_url, pool_maxsize=max(users, 1), key_ttl=0)
+    virtual_users = [VirtualUser(pf, credentials[number % len(credentials)], mix, photo, recorder)
+                     for number in range(users)]
+
+    time.sleep(max(0.0, start_at - time.time()))
+    deadline = time.perf_counter() + duration
+
+    if mode == 'open':
+        # Operations start at the target rate whether or not the previous ones have finished
+        free_users = queue.SimpleQueue()
+        for virtual_user in virtual_users:
+            free_users.put(virtual_user)
+
+        # Scheduled operations no user has started yet; the ones still waiting at the end are recorded as 'late'
+        waiting = set()
+
+        def run(scheduled):
+            waiting.discard(scheduled)
+            virtual_user = free_users.get()
+            try:
+                virtual_user.step(scheduled)
+            finally:
+                free_users.put(virtual_user)
+
+        def schedule():
+            with ThreadPoolExecutor(max_workers=users) as executor:
+                due = time.perf_counter()
+                while due < deadline:
+                    time.sleep(max(0.0, due - time.perf_counter()))
+                    waiting.add(due)
+                    executor.submit(run, due)
+                    due += 1.0 / rate
+                executor.shutdown(wait=True, cancel_futures=True)
+            ended = time.perf_counter()
+            for scheduled in list(waiting):
+                recorder.record('late', ended - scheduled, False)
+
+        threads = [threading.Thread(target=schedule)]
+    else:
+        # Every user makes its next operation after the previous one, paced to its share of the rate if it is set
+        def loop(virtual_user):
+            pace = users / rate if rate else 0.0
+            due = time.perf_counter()
+            while time.perf_counter() < deadline:
+                virtual_user.step()
+                due += pace
+                time.sleep(max(think_time, due - time.perf_counter()))
+
+        threads = [threading.Thread(target=loop, args=(virtual_user,)) for virtual_user in virtual_users]
+
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        for thread in threads:
+            thread.join(timeout=max(0.0, interval - 0.01))
+            if thread.is_alive():
+                break
+        results.put(recorder.drain())
+    results.put(recorder.drain())
+    results.put(None)
+    pf.close()
+
+
+def _statistics(latencies: list, errors: int, elapsed: float) -> dict:
+    stats = summarize(latencies, elapsed)
+    stats['errors'] = errors
+    stats['error_rate'] = errors / stats['count'] if stats['count'] else 0.0
+    return stats
+
+
+def build_report(collected: dict, elapsed: float) -> dict:
+    '''Turns {operation: (latencies, errors)} into statistics per operation and in total'''
+
+    operations = {operation: _statistics(latencies, errors, elapsed)
+                  for operation, (latencies, errors) in sorted(collected.items())}
+    all_latencies = [latency for latencies, _ in collected.values() for latency in latencies]
+    total = _statistics(all_latencies, sum(errors for _, errors in collected.values()), elapsed)
+    return {'elapsed': elapsed, 'operations': operations, 'total': total}
+
+
+def print_report(report: dict, final: bool = False):
+    print('%s after %.1f s' % ('Final report' if final else 'Last interval', report['elapsed']))
+    print('%-12s %8s %9s %7s %9s %9s %9s' % ('operation', 'count', 'req/s', 'err %', 'p50 ms', 'p95 ms', 'p99 ms'))
+    for operation, stats in list(report['operations'].items()) + [('TOTAL', report['total'])]:
+        print('%-12s %8d %9.1f %7.2f %9.2f %9.2f %9.2f' % (
+            operation, stats['count'], stats['throughput'], stats['error_rate'] * 100,
+            stats['p50_ms'], stats['p95_ms'], stats['p99_ms']))
+    print(flush=True)
+
+
+def run_load(base_url: str, credentials, users: int = 10, duration: float = 30, rate: float = None,
+             mode: str = 'closed', mix: dict = None, processes: int = 1, think_time: float = 0.0,
+             photo: str = DEFAULT_PHOTO, interval: float = 5, on_report=print_report) -> dict:
+    '''Drives the server at 'base_url' with 'users' virtual users for 'duration' seconds and returns the final report:
+    {'elapsed', 'operations': {operation: statistics}, 'total': statistics} with count, errors, error rate,
+    throughput and latency percentiles. on_report(report) is called with the statistics of every 'interval'.
+
+    credentials - (email, password) or a list of them that the users take in turn,
+    rate - operations per second of all users together; in the 'open' mode they start at this rate whatever the
+    latency is, in the 'closed' mode every user waits for its operation and paces itself to its share of the rate
+    (without a rate it goes as fast as it can, pausing 'think_time' seconds between operations),
+    mix - {operation: weight} of list, list_my, add, add_simple, update, set_photo, delete,
+    processes - the users and the rate are split between this many processes to use more than one CPU.
+
+    Besides the operations of the mix, the report has 'login', for every key request including failed ones, and in the
+    'open' mode 'late', errors for the operations that were due but no user had started when the time was up.'''
+
+    if mode not in ('open', 'closed'):
+        raise ValueError("mode must be 'open' or 'closed'")
+    if mode == 'open' and not rate:
+        raise ValueError('The open mode needs a rate')
+    if isinstance(credentials, tuple):
+        credentials = [credentials]
+    mix = dict(mix or DEFAULT_MIX)
+    processes = max(1, min(processes, users))
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    start_at = time.time() + 1.0 + 0.2 * processes
+    workers = []
+    for number in range(processes):
+        worker_users = users // processes + (1 if number < users % processes else 0)
+        worker_rate = rate * worker_users / users if rate else None
+        worker = context.Process(target=_worker, args=(
+            base_url, credentials, worker_users, worker_rate, mode, mix, think_time, photo, start_at, duration,
+            interval, results), daemon=True)
+        worker.start()
+        workers.append(worker)
+
+    collected = {}
+    interval_collected = {}
+    interval_started = time.time()
+    running = len(workers)
+    while running:
+        try:
+            batch = results.get(timeout=interval)
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                # A worker that crashed never sends its None
+                break
+            batch = {}
+        if batch is None:
+            running -= 1
+            continue
+
+        for target in (collected, interval_collected):
+            for operation, (latencies, errors) in batch.items():
+                stored = target.setdefault(operation, ([], 0))
+                stored[0].extend(latencies)
+                target[operation] = (stored[0], stored[1] + errors)
+
+        if time.time() - interval_started >= interval:
+            if on_report is not None and interval_collected:
+                on_report(build_report(interval_collected, time.time() - interval_started))
+            interval_collected = {}
+            interval_started = time.time()
+
+    for worker in workers:
+        worker.join()
+
+    return build_report(collected, max(time.time() - start_at, 1e-9))
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description='Load generation for the PetFriends API with virtual users')
+    parser.add_argument('--base-url', help='server to load; without it a local stand-in server is started')
+    parser.add_argument('--email', default='load@petfriends.local')
+    parser.add_argument('--password', default='load')
+    parser.add_argument('--users', type=int, default=10, help='number of virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run')
+    parser.add_argument('--rate', type=float, help='target operations per second of all users together')
+    parser.add_argument('--mode', choices=['open', 'closed'], default='closed')
+    parser.add_argument('--mix', help='weights of the operations, e.g. list=5,add=1,delete=1')
+    parser.add_argument('--processes', type=int, default=1, help='processes the users are split between')
+    parser.add_argument('--think-time', type=float, default=0.0, help='pause of a user between operations')
+    parser.add_argument('--photo', default=DEFAULT_PHOTO)
+    parser.add_argument('--interval', type=float, default=5, help='seconds between live reports')
+    parser.add_argument('--latency', type=float, default=0.0, help='latency injected by the local stand-in')
+    parser.add_argument('--output', help='file to store the final report in as JSON')
+    args = parser.parse_args(argv)
+
+    mix = None
+    if args.mix:
+        mix = {name: float(weight) for name, weight in (item.split('=') for item in args.mix.split(','))}
+        unknown = set(mix) - set(DEFAULT_MIX)
+        if unknown:
+            parser.error('unknown operations in --mix: %s' % ', '.join(sorted(unknown)))
+
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        from stand_in_server import StandInServer
+
+        server = StandInServer(users={args.email: args.password}, latency=args.latency)
+        server.start()
+        base_url = server.base_url
+
+    try:
+        report = run_load(base_url, (args.email, args.password), args.users, args.duration, args.rate, args.mode,
+                          mix, args.processes, args.think_time, args.photo, args.interval)
+    finally:
+        if server is not None:
+            server.stop()
+
+    print_report(report, final=True)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    return 1 if report['total']['count'] == 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import threading
+
+
+class PetIndex:
+    def __init__(self, pets=()):
+        '''In-memory copy of a user's own pets with lookup by ID in constant time and secondary indexes on 'name'
+        and 'animal_type'. It is filled from one list request and then kept up to date with the results of the
+        requests that change pets. 'stale' is set when a change could not be applied, e.g. the server answered with
+        an error whose effect is unknown; the index must then be loaded again. Safe to use from many threads.'''
+
+        self.stale = False
+        self._by_id = {}
+        self._by_name = {}
+        self._by_animal_type = {}
+        self._lock = threading.RLock()
+        self.load(pets)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __contains__(self, pet_id: str) -> bool:
+        return pet_id in self._by_id
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._by_id.values()))
+
+    def load(self, pets):
+        '''Replaces the whole content of the index with the given pets and clears the 'stale' flag'''
+
+        with self._lock:
+            # Stays stale if reading the pets fails halfway
+            self.stale = True
+            self._by_id.clear()
+            self._by_name.clear()
+            self._by_animal_type.clear()
+            for pet in pets:
+                self.put(pet)
+            self.stale = False
+
+    def put(self, pet: dict):
+        '''Adds a pet or updates the stored one with the fields of 'pet', which must contain 'id\''''
+
+        with self._lock:
+            old = self._by_id.get(pet['id'])
+            if old is not None:
+                self._unlink(old)
+                merged = dict(old, **pet)
+                # Records such as records.Pet stay records
+                pet = merged if isinstance(old, dict) else type(old).from_dict(merged)
+            self._by_id[pet['id']] = pet
+            self._by_name.setdefault(pet.get('name'), set()).add(pet['id'])
+            self._by_animal_type.setdefault(pet.get('animal_type'), set()).add(pet['id'])
+
+    def remove(self, pet_id: str):
+        '''Removes the pet with the ID if it is in the index'''
+
+        with self._lock:
+            pet = self._by_id.pop(pet_id, None)
+            if pet is not None:
+                self._unlink(pet)
+
+    def mark_stale(self):
+        self.stale = True
+
+    def get(self, pet_id: str) -> dict:
+        '''Returns the pet with the ID or None'''
+
+        return self._by_id.get(pet_id)
+
+    def find_by_name(self, name: str) -> list:
+        with self._lock:
+            return [self._by_id[pet_id] for pet_id in self._by_name.get(name, ())]
+
+    def find_by_animal_type(self, animal_type: str) -> list:
+        with self._lock:
+            return [self._by_id[pet_id] for pet_id in self._by_animal_type.get(animal_type, ())]
+
+    def _unlink(self, pet: dict):
+        for index, value in ((self._by_name, pet.get('name')), (self._by_animal_type, pet.get('animal_type'))):
+            ids = index.get(value)
+            if ids is not None:
+                ids.discard(pet['id'])
+                if not ids:
+                    del index[value]
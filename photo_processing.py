@@ -0,0 +1,200 @@
+import hashlib
+import io
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# Changes whenever transcode() starts producing different bytes, so older cached results are not used
+VERSION = 1
+
+
+class ProcessedPhoto(bytes):
+    '''Bytes of a photo that has already been preprocessed; PhotoProcessor passes them through unchanged.
+    'name' is the file name of the upload: the one of the source photo, with .jpg if the photo was transcoded'''
+
+    name = None
+
+
+def transcode(data: bytes, max_size: int, quality: int) -> bytes:
+    '''Returns the image scaled down to fit into max_size x max_size and saved as JPEG with the given quality.
+    The original bytes are returned if they are not an image Pillow can read, or if the image is small enough and
+    recompressing it would not make it smaller. An image with more pixels than Pillow allows raises
+    Image.DecompressionBombError'''
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image)
+            resized = max(image.size) > max_size
+            if resized:
+                image.thumbnail((max_size, max_size), Image.LANCZOS)
+
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            elif image.mode != 'RGB':
+                image = image.convert('RGB')
+
+            output = io.BytesIO()
+            image.save(output, 'JPEG', quality=quality, optimize=True, progressive=True)
+    except (OSError, ValueError):
+        return data
+
+    processed = output.getvalue()
+    return processed if resized or len(processed) < len(data) else data
+
+
+def _source_name(pet_photo) -> str:
+    if isinstance(pet_photo, (str, os.PathLike)):
+        return os.path.basename(pet_photo)
+    if isinstance(pet_photo, (bytes, bytearray, memoryview)):
+        return None
+    name = getattr(pet_photo, 'name', None)
+    return os.path.basename(name) if isinstance(name, str) else None
+
+
+def _named(processed: ProcessedPhoto, pet_photo, data: bytes) -> ProcessedPhoto:
+    '''Gives the processed photo the file name of its source 'pet_photo', with a .jpg extension if transcode
+    has turned the source 'data' into a JPEG'''
+
+    name = _source_name(pet_photo)
+    if name is None:
+        return processed
+    if processed != data:
+        name = os.path.splitext(name)[0] + '.jpg'
+    named = ProcessedPhoto(processed)
+    named.name = name
+    return named
+
+
+def _read(pet_photo) -> bytes:
+    if isinstance(pet_photo, (str, os.PathLike)):
+        with open(pet_photo, 'rb') as file:
+            return file.read()
+    if isinstance(pet_photo, (bytes, bytearray, memoryview)):
+        return bytes(pet_photo)
+
+    start = pet_photo.tell()
+    data = pet_photo.read()
+    pet_photo.seek(start)
+    return data
+
+
+class PhotoProcessor:
+    def __init__(self, max_size: int = 1024, quality: int = 85, cache_dir: str = None, max_workers: int = None):
+        '''Downsizes and recompresses photos before they are uploaded. Needs Pillow (pip install Pillow).
+
+        max_size - the longest side of the image in pixels, larger images are scaled down,
+        quality - JPEG quality 1-95 the images are saved with,
+        cache_dir - directory where processed photos are stored by the hash of the source image and the settings,
+        so every image is only processed once; without it nothing is stored,
+        max_workers - processes that transcode the photos of process_many (the number of CPUs if not set).'''
+
+        if Image is None:
+            raise ImportError('Photo preprocessing needs Pillow: pip install Pillow')
+
+        self.max_size = max_size
+        self.quality = quality
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_key(self, data: bytes) -> str:
+        digest = hashlib.sha256(data)
+        digest.update(('|%s|%s|%s' % (VERSION, self.max_size, self.quality)).encode())
+        return digest.hexdigest()
+
+    def _load(self, key: str) -> ProcessedPhoto:
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(os.path.join(self.cache_dir, key + '.jpg'), 'rb') as file:
+                return ProcessedPhoto(file.read())
+        except FileNotFoundError:
+            return None
+
+    def _store(self, key: str, processed: bytes) -> ProcessedPhoto:
+        if self.cache_dir is not None:
+            # Written to a temporary file first, so other processes never read a half-written photo
+            descriptor, temporary = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(descriptor, 'wb') as file:
+                file.write(processed)
+            os.replace(temporary, os.path.join(self.cache_dir, key + '.jpg'))
+        return ProcessedPhoto(processed)
+
+    def process(self, pet_photo) -> ProcessedPhoto:
+        '''Returns the processed bytes of a photo given as a path, bytes or a seekable binary file object'''
+
+        if isinstance(pet_photo, ProcessedPhoto):
+            return pet_photo
+
+        data = _read(pet_photo)
+        key = self._cache_key(data)
+        processed = self._load(key)
+        if processed is None:
+            processed = self._store(key, transcode(data, self.max_size, self.quality))
+        return _named(processed, pet_photo, data)
+
+    def process_many(self, photos: list) -> list:
+        '''Returns the processed bytes of every photo in the order of 'photos'. Photos that are not cached are
+        transcoded in parallel in a process pool, and equal images only once. A photo that cannot be read or
+        processed (a missing file, an image too large to decode) does not stop the others: its place in the list
+        holds the exception instead'''
+
+        results = [None] * len(photos)
+        pending = {}
+        for number, pet_photo in enumerate(photos):
+            if isinstance(pet_photo, ProcessedPhoto):
+                results[number] = pet_photo
+                continue
+
+            try:
+                data = _read(pet_photo)
+                key = self._cache_key(data)
+                processed = self._load(key)
+            except Exception as error:
+                results[number] = error
+                continue
+            if processed is not None:
+                results[number] = _named(processed, pet_photo, data)
+            else:
+                pending.setdefault(key, (data, []))[1].append(number)
+
+        transcoded = {}
+        if len(pending) == 1:
+            # Not worth starting processes for
+            for key, (data, _) in pending.items():
+                try:
+                    transcoded[key] = transcode(data, self.max_size, self.quality)
+                except Exception as error:
+                    transcoded[key] = error
+        elif pending:
+            with ProcessPoolExecutor(self.max_workers) as pool:
+                futures = {key: pool.submit(transcode, data, self.max_size, self.quality)
+                           for key, (data, _) in pending.items()}
+                for key, future in futures.items():
+                    try:
+                        transcoded[key] = future.result()
+                    except Exception as error:
+                        transcoded[key] = error
+
+        for key, processed in transcoded.items():
+            if not isinstance(processed, Exception):
+                try:
+                    processed = self._store(key, processed)
+                except OSError as error:
+                    processed = error
+            data, numbers = pending[key]
+            for number in numbers:
+                if isinstance(processed, Exception):
+                    results[number] = processed
+                else:
+                    results[number] = _named(processed, photos[number], data)
+        return results
@@ -0,0 +1,124 @@
+import io
+import mimetypes
+import mmap
+import os
+from contextlib import ExitStack, contextmanager
+
+# Leading bytes of the image formats the server can receive and their content types
+SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+]
+
+
+def detect_content_type(head: bytes, name: str = None) -> str:
+    '''Returns the content type of an image by its first bytes, or by the file name if the bytes are not recognized'''
+
+    for signature, content_type in SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+
+    if name:
+        content_type, _ = mimetypes.guess_type(name)
+        if content_type:
+            return content_type
+    return 'application/octet-stream'
+
+
+class PhotoReader:
+    def __init__(self, source):
+        '''Reads a photo for MultipartEncoder piece by piece, so only the requested chunk is held in memory.
+        'source' is either a buffer (bytes, bytearray, memoryview, mmap), which is read without copying it as a whole,
+        or a seekable binary file object, which is read from its current position.'''
+
+        if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+            self._view = memoryview(source).cast('B')
+            self._file = None
+            self._start = 0
+            self._end = len(self._view)
+        else:
+            if not source.seekable():
+                raise ValueError('The photo file object must be seekable to send its length')
+            self._view = None
+            self._file = source
+            self._start = source.tell()
+            self._end = source.seek(0, io.SEEK_END)
+            source.seek(self._start)
+        self._position = self._start
+
+    @property
+    def len(self) -> int:
+        '''Number of bytes that are not read yet'''
+
+        return self._end - self._position
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.len
+        size = min(size, self.len)
+
+        if self._view is not None:
+            chunk = bytes(self._view[self._position:self._position + size])
+        else:
+            chunk = self._file.read(size)
+        self._position += len(chunk)
+        return chunk
+
+    def peek(self, size: int) -> bytes:
+        '''Returns the next bytes without moving the read position'''
+
+        if self._view is not None:
+            return bytes(self._view[self._position:self._position + size])
+
+        chunk = self._file.read(size)
+        self._file.seek(self._position)
+        return chunk
+
+    def rewind(self):
+        '''Moves back to the position the reader started at, so the same photo can be sent again'''
+
+        self._position = self._start
+        if self._file is not None:
+            self._file.seek(self._start)
+
+    def release(self):
+        '''Releases the buffer so that a memory-mapped file can be closed'''
+
+        if self._view is not None:
+            self._view.release()
+
+
+@contextmanager
+def open_photo(pet_photo, use_mmap: bool = False):
+    '''Opens a photo for uploading and yields (file name, PhotoReader, content type). 'pet_photo' can be a path,
+    a bytes-like object or a seekable binary file object. A file opened by path (and memory-mapped if 'use_mmap' is set)
+    is closed when the block exits; a file object passed by the caller is left open and only rewound.'''
+
+    with ExitStack() as stack:
+        if isinstance(pet_photo, (str, os.PathLike)):
+            name = os.path.basename(pet_photo)
+            file = stack.enter_context(open(pet_photo, 'rb'))
+            if use_mmap and os.fstat(file.fileno()).st_size > 0:
+                source = stack.enter_context(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+            else:
+                source = file
+        elif isinstance(pet_photo, (bytes, bytearray, memoryview, mmap.mmap)):
+            # Preprocessed photos (photo_processing.ProcessedPhoto) keep the file name of their source
+            name = getattr(pet_photo, 'name', None) or 'pet_photo'
+            source = pet_photo
+        else:
+            name = os.path.basename(getattr(pet_photo, 'name', None) or 'pet_photo')
+            source = pet_photo
+
+        reader = PhotoReader(source)
+        stack.callback(reader.release)
+        try:
+            yield name, reader, detect_content_type(reader.peek(16), name)
+        finally:
+            if source is pet_photo:
+                reader.rewind()
@@ -0,0 +1,102 @@
+import base64
+import json
+import sys
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Decodes JSON from bytes or str; orjson is used if it is installed, it is several times faster than json
+loads = orjson.loads if orjson is not None else json.loads
+
+
+class Pet:
+    '''Compact record of a pet as the server returns it. The attributes live in slots instead of a dict per pet, equal
+    animal types share one string, and the photo stays the data URI it arrived as until photo is read. Fields the server
+    may add besides the slots are not kept. It can be read like the dict it replaces: pet['name'], pet.get('age').'''
+
+    __slots__ = ('id', 'name', 'animal_type', 'age', 'pet_photo', 'created_at', 'user_id')
+
+    def __init__(self, id: str, name: str = None, animal_type: str = None, age: str = None, pet_photo: str = None,
+                 created_at: str = None, user_id: str = None):
+        self.id = id
+        self.name = name
+        self.animal_type = sys.intern(animal_type) if isinstance(animal_type, str) else animal_type
+        self.age = age
+        self.pet_photo = pet_photo
+        self.created_at = created_at
+        self.user_id = user_id
+
+    @classmethod
+    def from_dict(cls, pet: dict) -> 'Pet':
+        return cls(pet['id'], pet.get('name'), pet.get('animal_type'), pet.get('age'), pet.get('pet_photo'),
+                   pet.get('created_at'), pet.get('user_id'))
+
+    def keys(self) -> list:
+        '''The fields that are set, so that dict(pet) and {**pet} work'''
+
+        return [field for field in self.__slots__ if getattr(self, field) is not None]
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.keys()}
+
+    @property
+    def photo(self) -> bytes:
+        '''The image decoded from the 'data:<type>;base64,' URI, or None without a photo'''
+
+        if not self.pet_photo:
+            return None
+        return base64.b64decode(self.pet_photo.partition(',')[2])
+
+    @property
+    def photo_content_type(self) -> str:
+        if not self.pet_photo:
+            return None
+        return self.pet_photo[5:].partition(';')[0] or None
+
+    def __getitem__(self, field: str):
+        if field not in self.__slots__:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __contains__(self, field: str) -> bool:
+        return field in self.__slots__ and getattr(self, field) is not None
+
+    def get(self, field: str, default=None):
+        value = getattr(self, field, None) if field in self.__slots__ else None
+        return default if value is None else value
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Pet):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return 'Pet(id=%r, name=%r, animal_type=%r, age=%r)' % (self.id, self.name, self.animal_type, self.age)
+
+
+def to_records(result):
+    '''Turns a decoded pet, or the pets of a decoded list {"pets": [...]}, into Pet records. Other results are returned
+    as they are'''
+
+    if isinstance(result, dict):
+        pets = result.get('pets')
+        if isinstance(pets, list):
+            result['pets'] = [Pet.from_dict(pet) if isinstance(pet, dict) and 'id' in pet else pet for pet in pets]
+        elif 'id' in result and 'animal_type' in result:
+            return Pet.from_dict(result)
+    return result
+
+
+def decode(body: bytes, typed: bool = False):
+    '''Returns the result decoded from a JSON response body, with the pets as Pet records if 'typed' is set,
+    or the text of a body that is not JSON'''
+
+    try:
+        result = loads(body)
+    except ValueError:
+        return body.decode('utf-8', errors='replace')
+    return to_records(result) if typed else result
@@ -0,0 +1,71 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# A cached answer: the decoded result, the validators the server sent with it (None if it did not) and the time
+# (time.monotonic) it was received or last confirmed by the server
+CacheEntry = namedtuple('CacheEntry', ['result', 'etag', 'last_modified', 'stored_at'])
+
+
+class ResponseCache:
+    def __init__(self, ttl: float = 30, max_entries: int = 128):
+        '''LRU cache of decoded list responses keyed by (auth key, filter). An entry younger than 'ttl' seconds is
+        used without a request; an older one is revalidated with If-None-Match / If-Modified-Since if the server sent
+        an ETag or Last-Modified. No more than 'max_entries' are kept, the least recently used are dropped first.
+        Safe to use from many threads.'''
+
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Grows with every invalidation, so that a list requested before a change is not stored after it
+        self.generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: tuple) -> CacheEntry:
+        '''Returns the entry or None and marks it as recently used'''
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return time.monotonic() - entry.stored_at < self.ttl
+
+    def put(self, key: tuple, result, etag: str = None, last_modified: str = None, generation: int = None):
+        '''Stores the result unless the cache was invalidated after 'generation' was read'''
+
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = CacheEntry(result, etag, last_modified, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def touch(self, key: tuple):
+        '''Starts the TTL of the entry again after the server has confirmed it is not modified'''
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = entry._replace(stored_at=time.monotonic())
+
+    def invalidate(self, auth_key: str = None):
+        '''Drops the entries a change of pets by the user with 'auth_key' can affect: the lists of all pets of every
+        user and the user's own pets. Without 'auth_key' everything is dropped'''
+
+        with self._lock:
+            self.generation += 1
+            if auth_key is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[1] != 'my_pets' or key[0] == auth_key]:
+                del self._entries[key]
+
+    def clear(self):
+        self.invalidate()
@@ -5,4 +5,16 @@ from dotenv import load_dotenv
 load_dotenv()
 
 valid_email = os.getenv('valid_email')
-valid_password = os.getenv('valid_password')
\ No newline at end of file
+valid_password = os.getenv('valid_password')
+
+# With use_stand_in=1 the tests run against the local stand_in_server.StandInServer started on stand_in_port
+# instead of the real server, and the valid user is created there
+use_stand_in = os.getenv('use_stand_in') == '1'
+stand_in_port = int(os.getenv('stand_in_port', '8765'))
+
+if use_stand_in:
+    base_url = 'http://127.0.0.1:%d' % stand_in_port
+    valid_email = valid_email or 'stand-in@petfriends.local'
+    valid_password = valid_password or 'stand-in'
+else:
+    base_url = os.getenv('base_url', 'https://petfriends.skillfactory.ru')
@@ -0,0 +1,355 @@
+import argparse
+import base64
+import email.parser
+import email.policy
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class StandInServer:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, users: dict = None, latency=0.0,
+                 error_rate: float = 0.0, max_name_length: int = 255):
+        '''Local in-memory stand-in for the PetFriends REST API, for running the client and the tests without network.
+        It serves /api/key, /api/pets (GET with 'filter' and POST), /api/pets/<id> (PUT and DELETE),
+        /api/pets/set_photo/<id> and /api/create_pet_simple from a thread per connection with keep-alive.
+
+        users - {email: password} of the accounts that can get a key,
+        latency - seconds added before every answer, a number or a (min, max) range for a random delay,
+        error_rate - share of requests answered with 500 without doing anything,
+        max_name_length - longer pet names are rejected with 400.
+
+        Unlike the real server it answers 403 for changing another user's pet and 400 for empty fields or a non-numeric
+        age, as the API documentation describes. Deleting a pet answers 200 with an empty body, like the real server.
+        Lists of pets carry an ETag and Last-Modified that change with every change of pets and are answered with 304
+        to a matching If-None-Match or If-Modified-Since.'''
+
+        self.users = dict(users or {})
+        self.keys = {self.key_for(email): email for email in self.users}
+        self.rotated_keys = {}
+        self.latency = latency
+        self.error_rate = error_rate
+        self.max_name_length = max_name_length
+        self.pets = {}
+        self.version = 0
+        self.modified = time.time()
+        self.lock = threading.Lock()
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.stand_in = self
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return 'http://%s:%d' % (host, port)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        '''Starts serving in a background thread'''
+
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def key_for(self, email: str) -> str:
+        '''The ID of a user, derived from the email. It is also the key until rotate_key is called, so every key request
+        returns the same key like on the real server'''
+
+        return hashlib.sha1(('stand-in:' + email).encode()).hexdigest()
+
+    def rotate_key(self, email: str) -> str:
+        '''Gives the user a new key and makes the old ones answer 403, like when the real server renews keys.
+        The user keeps the pets. Returns the new key'''
+
+        key = uuid.uuid4().hex
+        with self.lock:
+            for old in [old for old, owner in self.keys.items() if owner == email]:
+                del self.keys[old]
+            self.keys[key] = email
+            self.rotated_keys[email] = key
+        return key
+
+    def add_user(self, email: str, password: str) -> dict:
+        self.users[email] = password
+        self.keys[self.key_for(email)] = email
+        return {'key': self.key_for(email)}
+
+    def add_pet(self, email: str, name: str, animal_type: str, age: str, photo: bytes = b'',
+                content_type: str = 'image/jpeg') -> dict:
+        '''Stores a pet of the user directly, e.g. to fill the server before a run, and returns it'''
+
+        pet = {
+            'age': str(age),
+            'animal_type': animal_type,
+            'created_at': '%.6f' % time.time(),
+            'id': uuid.uuid4().hex,
+            'name': name,
+            'pet_photo': photo_uri(photo, content_type),
+            'user_id': self.key_for(email)
+        }
+        with self.lock:
+            self.pets[pet['id']] = pet
+            self.changed()
+        return pet
+
+    def changed(self):
+        '''Moves the version of the pets on; must be called under 'lock' after every change'''
+
+        self.version += 1
+        self.modified = time.time()
+
+
+def photo_uri(photo: bytes, content_type: str) -> str:
+    if not photo:
+        return ''
+    return 'data:%s;base64,%s' % (content_type, base64.b64encode(photo).decode())
+
+
+def parse_form(content_type: str, body: bytes) -> dict:
+    '''Returns the fields of a multipart/form-data or urlencoded body as {name: value}; a file becomes
+    (bytes, content type)'''
+
+    if content_type.startswith('multipart/form-data'):
+        message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+            b'Content-Type: ' + content_type.encode() + b'\r\n\r\n' + body)
+        fields = {}
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            payload = part.get_payload(decode=True)
+            if part.get_filename() is not None:
+                fields[name] = (payload, part.get_content_type())
+            else:
+                fields[name] = payload.decode('utf-8')
+        return fields
+
+    return {name: values[0] for name, values in parse_qs(body.decode('utf-8'), keep_blank_values=True).items()}
+
+
+class _Server(ThreadingHTTPServer):
+    # The default backlog of 5 drops connections that many clients open at once, and they wait a second to retry
+    request_queue_size = 128
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, which without TCP_NODELAY stalls small answers on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def stand_in(self) -> StandInServer:
+        return self.server.stand_in
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        self._dispatch()
+
+    def do_PUT(self):
+        self._dispatch()
+
+    def do_DELETE(self):
+        self._dispatch()
+
+    def _dispatch(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+
+        latency = self.stand_in.latency
+        if isinstance(latency, (tuple, list)):
+            latency = random.uniform(*latency)
+        if latency:
+            time.sleep(latency)
+
+        if self.stand_in.error_rate and random.random() < self.stand_in.error_rate:
+            return self._send_html(500, 'Internal Server Error')
+
+        url = urlsplit(self.path)
+        parts = url.path.strip('/').split('/')
+
+        if parts == ['api', 'key'] and self.command == 'GET':
+            return self._get_key()
+
+        user_id = self._authorized_user()
+        if user_id is None:
+            return self._send_html(403, "Please provide 'auth_key' Header")
+
+        if parts == ['api', 'pets'] and self.command == 'GET':
+            return self._list_pets(user_id, parse_qs(url.query).get('filter', [''])[0])
+        if parts == ['api', 'pets'] and self.command == 'POST':
+            return self._create_pet(user_id, parse_form(self.headers.get('Content-Type', ''), body), True)
+        if parts == ['api', 'create_pet_simple'] and self.command == 'POST':
+            return self._create_pet(user_id, parse_form(self.headers.get('Content-Type', ''), body), False)
+        if len(parts) == 3 and parts[:2] == ['api', 'pets'] and self.command in ('PUT', 'DELETE'):
+            return self._change_pet(user_id, parts[2], self.headers.get('Content-Type', ''), body)
+        if len(parts) == 4 and parts[:3] == ['api', 'pets', 'set_photo'] and self.command == 'POST':
+            return self._set_photo(user_id, parts[3], parse_form(self.headers.get('Content-Type', ''), body))
+
+        self._send_html(404, 'Not Found')
+
+    def _authorized_user(self) -> str:
+        email = self.stand_in.keys.get(self.headers.get('auth_key'))
+        return self.stand_in.key_for(email) if email is not None else None
+
+    def _get_key(self):
+        email = self.headers.get('email')
+        password = self.headers.get('password')
+        if not email or not password or self.stand_in.users.get(email) != password:
+            return self._send_html(403, 'This user wasn&#x27;t found in database')
+        self._send_json(200, {'key': self.stand_in.rotated_keys.get(email) or self.stand_in.key_for(email)})
+
+    def _list_pets(self, user_id: str, filter: str):
+        if filter not in ('', 'my_pets'):
+            return self._send_html(500, 'Filter value is incorrect')
+        with self.stand_in.lock:
+            pets = list(self.stand_in.pets.values())
+            etag = '"%d"' % self.stand_in.version
+            modified = int(self.stand_in.modified)
+
+        validators = {'ETag': etag, 'Last-Modified': formatdate(modified, usegmt=True)}
+        if self._not_modified(etag, modified):
+            return self._send_body(304, b'', None, validators)
+
+        if filter == 'my_pets':
+            pets = [pet for pet in pets if pet['user_id'] == user_id]
+        self._send_json(200, {'pets': pets}, validators)
+
+    def _not_modified(self, etag: str, modified: int) -> bool:
+        '''If-None-Match is checked first and If-Modified-Since is used only without it, as RFC 7232 says'''
+
+        if self.headers.get('If-None-Match') is not None:
+            return etag in [tag.strip() for tag in self.headers['If-None-Match'].split(',')]
+        if self.headers.get('If-Modified-Since') is not None:
+            try:
+                return modified <= parsedate_to_datetime(self.headers['If-Modified-Since']).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _invalid_fields(self, fields: dict) -> bool:
+        name, animal_type, age = (fields.get(field) for field in ('name', 'animal_type', 'age'))
+        return (not name or not animal_type or not age or not isinstance(age, str) or not age.isdigit()
+                or len(name) > self.stand_in.max_name_length)
+
+    def _create_pet(self, user_id: str, fields: dict, with_photo: bool):
+        photo = fields.get('pet_photo') if with_photo else None
+        if self._invalid_fields(fields) or (with_photo and not isinstance(photo, tuple)):
+            return self._send_html(400, 'Bad Request')
+
+        pet = {
+            'age': fields['age'],
+            'animal_type': fields['animal_type'],
+            'created_at': '%.6f' % time.time(),
+            'id': uuid.uuid4().hex,
+            'name': fields['name'],
+            'pet_photo': photo_uri(*photo) if photo else '',
+            'user_id': user_id
+        }
+        with self.stand_in.lock:
+            self.stand_in.pets[pet['id']] = pet
+            self.stand_in.changed()
+        self._send_json(200, pet)
+
+    def _own_pet(self, user_id: str, pet_id: str):
+        '''Returns the pet, or sends the error and returns None'''
+
+        with self.stand_in.lock:
+            pet = self.stand_in.pets.get(pet_id)
+        if pet is None:
+            self._send_html(400, 'Pet with this id wasn&#x27;t found')
+        elif pet['user_id'] != user_id:
+            self._send_html(403, 'This pet belongs to another user')
+        else:
+            return pet
+
+    def _change_pet(self, user_id: str, pet_id: str, content_type: str, body: bytes):
+        pet = self._own_pet(user_id, pet_id)
+        if pet is None:
+            return
+
+        if self.command == 'DELETE':
+            with self.stand_in.lock:
+                self.stand_in.pets.pop(pet_id, None)
+                self.stand_in.changed()
+            return self._send_body(200, b'', 'text/html; charset=utf-8')
+
+        fields = parse_form(content_type, body)
+        if self._invalid_fields(fields):
+            return self._send_html(400, 'Bad Request')
+        with self.stand_in.lock:
+            pet = dict(pet, name=fields['name'], animal_type=fields['animal_type'], age=fields['age'])
+            self.stand_in.pets[pet_id] = pet
+            self.stand_in.changed()
+        self._send_json(200, pet)
+
+    def _set_photo(self, user_id: str, pet_id: str, fields: dict):
+        pet = self._own_pet(user_id, pet_id)
+        if pet is None:
+            return
+
+        photo = fields.get('pet_photo')
+        if not isinstance(photo, tuple) or not photo[0]:
+            return self._send_html(400, 'Bad Request')
+        with self.stand_in.lock:
+            pet = dict(pet, pet_photo=photo_uri(*photo))
+            self.stand_in.pets[pet_id] = pet
+            self.stand_in.changed()
+        self._send_json(200, pet)
+
+    def _send_json(self, status: int, result, headers: dict = None):
+        self._send_body(status, json.dumps(result).encode(), 'application/json', headers)
+
+    def _send_html(self, status: int, message: str):
+        body = '<!doctype html><html><title>%d</title><p>%s</p></html>' % (status, message)
+        self._send_body(status, body.encode(), 'text/html; charset=utf-8')
+
+    def _send_body(self, status: int, body: bytes, content_type: str, headers: dict = None):
+        self.send_response(status)
+        if content_type is not None:
+            self.send_header('Content-Type', content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local in-memory stand-in for the PetFriends REST API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--user', action='append', default=[], metavar='EMAIL:PASSWORD',
+                        help='account that can get a key, can be repeated')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added before every answer')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with 500')
+    args = parser.parse_args()
+
+    server = StandInServer(args.host, args.port, dict(user.split(':', 1) for user in args.user),
+                           args.latency, args.error_rate)
+    print('Serving the PetFriends stand-in on', server.base_url)
+    server.serve_forever()
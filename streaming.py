@@ -0,0 +1,109 @@
+import codecs
+import re
+
+from records import loads
+
+# Characters that change the nesting outside of strings, and characters that can end a string
+STRUCTURE = re.compile(r'["{}\[\]]')
+STRING_END = re.compile(r'["\\]')
+SCALAR_END = re.compile(r'[,\]]')
+SEPARATORS = re.compile(r'[ \t\r\n,]*')
+
+
+def iter_json_array(chunks, key: str):
+    '''Yields the items of the array stored under 'key' in a JSON object that arrives as an iterable of byte chunks,
+    e.g. {"pets": [{...}, {...}]}. Every item is decoded as soon as its closing bracket has arrived, so only one item
+    and the unparsed rest of the last chunk are held in memory however long the array is. Stopping the iteration early
+    stops reading the chunks.'''
+
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    array_start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    buffer = ''
+    found = False
+    # State of the item being scanned: where it starts, how far it is scanned, nesting depth, whether inside a string
+    start = None
+    position = 0
+    depth = 0
+    in_string = False
+
+    for chunk in chunks:
+        buffer += decoder.decode(chunk)
+
+        if not found:
+            match = array_start.search(buffer)
+            if match is None:
+                # Keep only a tail long enough to contain the beginning of the key split between chunks
+                buffer = buffer[-(len(key) + 64):]
+                continue
+            found = True
+            buffer = buffer[match.end():]
+            position = 0
+
+        while True:
+            if start is None:
+                position = SEPARATORS.match(buffer, position).end()
+                if position >= len(buffer):
+                    buffer = ''
+                    position = 0
+                    break
+                if buffer[position] == ']':
+                    return
+                start = position
+
+            if in_string:
+                match = STRING_END.search(buffer, position)
+                if match is None:
+                    position = len(buffer)
+                    break
+                if match.group() == '\\':
+                    if match.end() >= len(buffer):
+                        # The escaped character has not arrived yet
+                        position = match.start()
+                        break
+                    position = match.end() + 1
+                    continue
+                in_string = False
+                position = match.end()
+                if depth == 0:
+                    yield loads(buffer[start:position])
+                    start = None
+                continue
+
+            if depth == 0 and buffer[start] not in '{["':
+                # A scalar item: it ends at the next comma or at the end of the array
+                end = SCALAR_END.search(buffer, start)
+                if end is None:
+                    break
+                yield loads(buffer[start:end.start()])
+                start = None
+                position = end.start()
+                continue
+
+            match = STRUCTURE.search(buffer, position)
+            if match is None:
+                position = len(buffer)
+                break
+
+            position = match.end()
+            char = match.group()
+            if char == '"':
+                in_string = True
+            elif char in '{[':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    yield loads(buffer[start:position])
+                    start = None
+
+        # Drop what is already yielded once per chunk, not after every item, so the buffer holds only the current item
+        consumed = start if start is not None else position
+        if consumed > 0:
+            buffer = buffer[consumed:]
+            position -= consumed
+            if start is not None:
+                start = 0
+
+    if not found:
+        raise ValueError('The response has no "%s" array' % key)
+    raise ValueError('The response ended before the "%s" array was closed' % key)
@@ -0,0 +1,37 @@
+import pytest
+
+from settings import stand_in_port, use_stand_in, valid_email, valid_password
+
+stand_in = None
+
+
+def pytest_configure(config):
+    '''Starts the local stand-in server when the tests are run with use_stand_in=1. It is filled with another user's pet,
+    which comes first in the list of all pets, and with a few pets of the valid user'''
+
+    global stand_in
+    if not use_stand_in:
+        return
+
+    from stand_in_server import StandInServer
+
+    stand_in = StandInServer(port=stand_in_port, users={valid_email: valid_password})
+    stand_in.add_user('other@petfriends.local', 'other')
+    stand_in.add_pet('other@petfriends.local', 'Murka', 'cat', '4')
+    for name, animal_type, age in (('Bella', 'zebra', '8'), ('Leo', 'lion', '5'), ('Rex', 'dog', '3')):
+        stand_in.add_pet(valid_email, name, animal_type, age)
+    stand_in.start()
+
+
+def pytest_unconfigure(config):
+    if stand_in is not None:
+        stand_in.stop()
+
+
+@pytest.fixture
+def stand_in_server():
+    '''The running stand-in server, for tests that need to change it; they are skipped against the real server'''
+
+    if stand_in is None:
+        pytest.skip('needs the stand-in server (use_stand_in=1)')
+    return stand_in
@@ -1,8 +1,19 @@
+import asyncio
 import os
+import threading
+import time
+import pytest
 from api import PetFriends
-from settings import valid_email, valid_password
+from bench import compare, percentile
+from async_api import AsyncPetFriends
+from instrumentation import Metrics
+from load_runner import run_load
+from records import Pet
+from response_cache import ResponseCache
+from stand_in_server import StandInServer
+from settings import base_url, use_stand_in, valid_email, valid_password
 
-pf = PetFriends()
+pf = PetFriends(base_url)
 
 def test_get_api_key_for_valid_user(email=valid_email, password=valid_password):
     """Check that the API key request returns a status of 200, and the result contains the word 'key'"""
@@ -81,6 +92,8 @@ def test_successful_add_new_simple_pet(name='Bella', animal_type='zebra', age='8
     assert status == 200
     assert result['name'] == name
 
+@pytest.mark.skipif(use_stand_in, reason="compares the bytes of the JPEG re-encoded by the real server, "
+                                         "the stand-in stores photos as they are sent")
 def test_successful_add_photo_of_pet(pet_photo = 'images/zebra_small.jpg'):
     """Checking the ability to add a photo to an existing pet"""
 
@@ -184,3 +197,323 @@ def test_unsuccessful_add_new_simple_pet_simbols_in_age(name='Goga', animal_type
 
     # Check that the response status is 400 Bad Request
     assert status == 400
+
+def test_pooled_client_reuses_session_and_closes(email=valid_email, password=valid_password):
+    """Check that the client can be used as a context manager and several calls go through the same pooled session"""
+
+    with PetFriends(base_url, pool_maxsize=2, retries=1) as client:
+        status, auth_key = client.get_api_key(email, password)
+        assert status == 200
+        status, result = client.get_list_of_pets(auth_key, 'my_pets')
+        assert status == 200
+        assert 'pets' in result
+
+def test_cached_api_key_and_credentials_instead_of_key(email=valid_email, password=valid_password):
+    """Check that a repeated key request is served from the cache and that methods accept (email, password) instead of the key"""
+
+    _, auth_key = pf.get_api_key(email, password)
+    status, cached_key = pf.get_api_key(email, password)
+    assert status == 200
+    assert cached_key == auth_key
+
+    status, result = pf.get_list_of_pets((email, password), 'my_pets')
+    assert status == 200
+    assert 'pets' in result
+
+def test_concurrent_key_requests_are_sent_once(email=valid_email, password=valid_password, threads=8):
+    """Check that threads asking for the same uncached key at the same time wait for one /api/key request"""
+
+    events = []
+    barrier = threading.Barrier(threads)
+    results = []
+
+    def get_key():
+        barrier.wait()
+        results.append(client.get_api_key(email, password))
+
+    with PetFriends(base_url) as client:
+        client.add_hook(events.append)
+        workers = [threading.Thread(target=get_key) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    assert [event.method_name for event in events] == ['get_api_key']
+    assert len(results) == threads
+    assert all(result == (200, results[0][1]) for result in results)
+
+def test_failed_key_request_is_shared_and_uncached_requests_run_in_parallel(threads=10, latency=0.1):
+    """Check that threads waiting for a key request that fails get its result instead of sending their own requests,
+    and that without the key cache concurrent key requests are not sent one after another"""
+
+    def get_keys(client, password):
+        barrier = threading.Barrier(threads)
+        results = []
+
+        def get_key():
+            barrier.wait()
+            results.append(client.get_api_key('shared@petfriends.local', password))
+
+        workers = [threading.Thread(target=get_key) for _ in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return results, time.perf_counter() - started
+
+    with StandInServer(users={'shared@petfriends.local': 'shared'}, latency=latency) as server:
+        events = []
+        with PetFriends(server.base_url, pool_maxsize=threads) as client:
+            client.add_hook(events.append)
+            results, _ = get_keys(client, 'wrong')
+        assert [event.method_name for event in events] == ['get_api_key']
+        assert all(status == 403 for status, _ in results)
+
+        with PetFriends(server.base_url, pool_maxsize=threads, key_ttl=0) as client:
+            results, elapsed = get_keys(client, 'shared')
+        assert all(status == 200 for status, _ in results)
+        assert elapsed < latency * threads / 2
+
+def test_rotated_key_is_renewed_once(stand_in_server, email='rotate@petfriends.local', password='rotate'):
+    """Check that after the server renews the key, only the first call made with the old key requests a new one
+    and later calls with the old key are repeated with the cached new key"""
+
+    stand_in_server.add_user(email, password)
+    events = []
+    with PetFriends(base_url) as client:
+        _, auth_key = client.get_api_key(email, password)
+        stand_in_server.rotate_key(email)
+        client.add_hook(events.append)
+
+        calls = []
+        for _ in range(3):
+            del events[:]
+            status, _ = client.get_list_of_pets(auth_key, 'my_pets')
+            assert status == 200
+            calls.append([(event.method_name, event.status) for event in events])
+
+    # The rejected request is reported when it is repeated, after the key request it caused
+    assert calls[0] == [('get_api_key', 200), ('get_list_of_pets', 403), ('get_list_of_pets', 200)]
+    assert calls[1] == calls[2] == [('get_list_of_pets', 403), ('get_list_of_pets', 200)]
+
+def test_async_client_gathers_many_requests(email=valid_email, password=valid_password):
+    """Check that the asyncio client returns the same (status, result) pairs for many requests gathered at once"""
+
+    async def run():
+        async with AsyncPetFriends(base_url, max_concurrency=5) as client:
+            status, auth_key = await client.get_api_key(email, password)
+            assert status == 200
+            return await asyncio.gather(*[client.get_list_of_pets(auth_key, 'my_pets') for _ in range(10)])
+
+    for status, result in asyncio.run(run()):
+        assert status == 200
+        assert 'pets' in result
+
+def test_bulk_add_and_delete_pets(email=valid_email, password=valid_password):
+    """Check that several pets can be added and then deleted in parallel, with a result for every pet"""
+
+    _, auth_key = pf.get_api_key(email, password)
+    pets = [{'name': 'Bulk%d' % i, 'animal_type': 'cat', 'age': '2'} for i in range(3)]
+
+    added = pf.add_new_pets(auth_key, pets, max_workers=3)
+    assert [report.status for report in added] == [200, 200, 200]
+    assert all(report.pet_id for report in added)
+
+    deleted = pf.delete_pets(auth_key, [report.pet_id for report in added], max_workers=3, rate_limit=10)
+    assert [report.status for report in deleted] == [200, 200, 200]
+
+def test_add_new_pet_with_photo_from_bytes_reports_progress(name='Stripes', animal_type='zebra', age='3',
+                                                            pet_photo='images/zebra_small.jpg'):
+    """Check that a photo can be uploaded from bytes in memory and that the upload progress reaches the full body size"""
+
+    with open(os.path.join(os.path.dirname(__file__), pet_photo), 'rb') as file:
+        photo = file.read()
+
+    _, auth_key = pf.get_api_key(valid_email, valid_password)
+    progress = []
+
+    status, result = pf.add_new_pet(auth_key, name, animal_type, age, photo,
+                                    progress=lambda sent, total: progress.append((sent, total)))
+
+    assert status == 200
+    assert result['name'] == name
+    assert progress[-1][0] == progress[-1][1]
+
+def test_iter_pets_streams_projected_pets(filter=''):
+    """Check that streaming the list of all pets yields the same pets as get_list_of_pets, with only the requested fields"""
+
+    _, auth_key = pf.get_api_key(valid_email, valid_password)
+    _, all_pets = pf.get_list_of_pets(auth_key, filter)
+
+    pets = list(pf.iter_pets(auth_key, filter, fields=('id', 'name'), limit=5))
+
+    assert pets == [{'id': pet['id'], 'name': pet['name']} for pet in all_pets['pets'][:5]]
+
+def test_pet_index_follows_add_and_delete(name='Indexed', animal_type='parrot', age='1'):
+    """Check that the pet index built from one list request is updated by adding and deleting a pet without new list requests"""
+
+    _, auth_key = pf.get_api_key(valid_email, valid_password)
+    index = pf.build_index(auth_key)
+
+    status, result = pf.add_new_pet_without_photo(auth_key, name, animal_type, age)
+    assert status == 200
+    assert index.get(result['id'])['name'] == name
+    assert result['id'] in [pet['id'] for pet in index.find_by_name(name)]
+
+    pf.delete_pet(auth_key, result['id'])
+    assert result['id'] not in index
+    assert pf.resync_index(auth_key) is index
+    pf.index = None
+
+def test_hooks_receive_request_events_and_metrics(filter='my_pets'):
+    """Check that registered hooks get an event for every request and that the built-in metrics count them per method"""
+
+    events = []
+    metrics = Metrics()
+    pf.add_hook(events.append)
+    pf.add_hook(metrics)
+    try:
+        _, auth_key = pf.get_api_key(valid_email, valid_password)
+        status, _ = pf.get_list_of_pets(auth_key, filter)
+    finally:
+        pf.remove_hook(events.append)
+        pf.remove_hook(metrics)
+
+    assert status == 200
+    assert events[-1].method_name == 'get_list_of_pets'
+    assert events[-1].status == 200
+    assert events[-1].response_bytes > 0
+    assert events[-1].total >= events[-1].ttfb
+    assert metrics.snapshot()['get_list_of_pets']['count'] == 1
+
+def test_cached_list_of_pets_is_dropped_after_adding_pet(name='Cached', animal_type='hamster', age='1'):
+    """Check that a cached list of own pets is reused and is requested again after a pet is added through the same client"""
+
+    with PetFriends(base_url, list_cache=ResponseCache(ttl=60)) as client:
+        _, auth_key = client.get_api_key(valid_email, valid_password)
+        _, my_pets = client.get_list_of_pets(auth_key, 'my_pets')
+        _, cached_pets = client.get_list_of_pets(auth_key, 'my_pets')
+        assert cached_pets is my_pets
+
+        status, result = client.add_new_pet_without_photo(auth_key, name, animal_type, age)
+        assert status == 200
+
+        _, my_pets = client.get_list_of_pets(auth_key, 'my_pets')
+        assert result['id'] in [pet['id'] for pet in my_pets['pets']]
+
+def test_load_runner_reports_every_operation(email=valid_email, password=valid_password):
+    """Check that a short closed-loop load run with two virtual users reports the operations of its mix without errors"""
+
+    reports = []
+    report = run_load(base_url, (email, password), users=2, duration=1, mix={'list_my': 1, 'add_simple': 1, 'delete': 1},
+                      interval=0.5, on_report=reports.append)
+
+    assert set(report['operations']) <= {'login', 'list_my', 'add_simple', 'delete'}
+    assert report['operations']['login']['count'] == 2
+    assert report['total']['count'] > 2
+    assert report['total']['errors'] == 0
+    assert report['total']['p95_ms'] >= report['total']['p50_ms']
+
+def test_load_runner_logins_of_many_users_run_in_parallel(users=6, latency=0.05):
+    """Check that virtual users with the same credentials log in at the same time, so the login latency stays close
+    to the latency of the server instead of growing with the number of users"""
+
+    with StandInServer(users={'load@petfriends.local': 'load'}, latency=latency) as server:
+        report = run_load(server.base_url, ('load@petfriends.local', 'load'), users=users, duration=0.5,
+                          mix={'list_my': 1}, on_report=None)
+
+    login = report['operations']['login']
+    assert login['count'] == users
+    assert login['errors'] == 0
+    assert login['p99_ms'] < latency * 1000 * 2.5
+
+def test_load_runner_counts_failed_logins_as_errors(unreachable_url='http://127.0.0.1:1'):
+    """Check that virtual users that cannot reach the server are reported as failed logins instead of no requests"""
+
+    report = run_load(unreachable_url, (valid_email, valid_password), users=1, duration=0.5, on_report=None)
+
+    assert report['operations']['login']['count'] >= 1
+    assert report['total']['error_rate'] == 1.0
+
+def test_typed_client_returns_pet_records(name='Typed', animal_type='zebra', age='2', pet_photo='images/zebra_small.jpg'):
+    """Check that a typed client returns pets as compact records that can still be read like dicts"""
+
+    with PetFriends(base_url, typed=True) as client:
+        _, auth_key = client.get_api_key(valid_email, valid_password)
+        status, pet = client.add_new_pet(auth_key, name, animal_type, age, pet_photo)
+        assert status == 200
+        assert isinstance(pet, Pet)
+        assert pet['name'] == pet.name == name
+        assert pet.photo_content_type == 'image/jpeg'
+        assert pet.photo[:2] == b'\xff\xd8'
+
+        _, my_pets = client.get_list_of_pets(auth_key, 'my_pets')
+        assert all(isinstance(record, Pet) for record in my_pets['pets'])
+        assert pet.id in [record['id'] for record in my_pets['pets']]
+        assert client.delete_pet(auth_key, pet.id)[0] == 200
+
+def test_bulk_add_pets_with_preprocessed_photos(tmp_path, pet_photos=('images/lion.jpg', 'images/zebra.jpg')):
+    """Check that photos are downsized before a bulk upload and that the processed photos are cached on disk"""
+
+    pytest.importorskip('PIL')
+    from photo_processing import PhotoProcessor
+
+    processor = PhotoProcessor(max_size=300, quality=80, cache_dir=str(tmp_path))
+    with PetFriends(base_url, photo_processor=processor) as client:
+        _, auth_key = client.get_api_key(valid_email, valid_password)
+        pets = [{'name': 'Small', 'animal_type': 'lion', 'age': '4', 'pet_photo': photo} for photo in pet_photos]
+        results = client.add_new_pets(auth_key, pets)
+        assert [result.status for result in results] == [200, 200]
+        client.delete_pets(auth_key, [result.pet_id for result in results])
+
+    assert len(os.listdir(tmp_path)) == len(pet_photos)
+    for photo in pet_photos:
+        assert len(processor.process(photo)) < os.path.getsize(photo)
+
+def test_bulk_add_pets_reports_photo_that_cannot_be_processed(tmp_path, pet_photos=('images/zebra.jpg', 'images/missing.jpg')):
+    """Check that a photo that cannot be preprocessed fails only its own pet and that processed photos keep their file name"""
+
+    pytest.importorskip('PIL')
+    from photo_processing import PhotoProcessor
+    from photos import open_photo
+
+    processor = PhotoProcessor(max_size=300, cache_dir=str(tmp_path))
+    with open_photo(processor.process(pet_photos[0])) as (filename, _, content_type):
+        assert (filename, content_type) == ('zebra.jpg', 'image/jpeg')
+
+    with PetFriends(base_url, photo_processor=processor) as client:
+        _, auth_key = client.get_api_key(valid_email, valid_password)
+        pets = [{'name': 'Partial', 'animal_type': 'zebra', 'age': '4', 'pet_photo': photo} for photo in pet_photos]
+        added, missing = client.add_new_pets(auth_key, pets)
+        assert added.status == 200
+        assert missing.status is None
+        assert isinstance(missing.error, FileNotFoundError)
+        client.delete_pet(auth_key, added.pet_id)
+
+def test_bench_percentile_and_regression_check():
+    """Check the interpolated percentiles of the benchmark and that only cases slower than the threshold are regressions"""
+
+    assert percentile([], 50) == 0.0
+    assert percentile([1.0, 2.0, 3.0, 4.0], 50) == 2.5
+    assert percentile([1.0, 2.0, 3.0, 4.0], 100) == 4.0
+    assert abs(percentile([float(value) for value in range(101)], 95) - 95.0) < 1e-9
+
+    baseline = {'fast': {'p50_ms': 10.0}, 'slow': {'p50_ms': 10.0}, 'gone': {'p50_ms': 1.0}}
+    results = {'fast': {'p50_ms': 11.9}, 'slow': {'p50_ms': 12.5}, 'new': {'p50_ms': 100.0}}
+    assert compare(results, baseline, threshold=0.2) == [('slow', 10.0, 12.5)]
+    assert compare(results, baseline, threshold=0.3) == []
+
+def test_transcoded_photo_is_uploaded_with_jpg_name(tmp_path):
+    """Check that a PNG that the preprocessing turns into a JPEG is sent with a .jpg file name"""
+
+    image = pytest.importorskip('PIL.Image')
+    from photo_processing import PhotoProcessor
+    from photos import open_photo
+
+    source = str(tmp_path / 'cat.png')
+    image.open('images/zebra.jpg').save(source)
+
+    with open_photo(PhotoProcessor(max_size=300).process(source)) as (filename, _, content_type):
+        assert (filename, content_type) == ('cat.jpg', 'image/jpeg')